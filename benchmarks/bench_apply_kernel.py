@@ -0,0 +1,63 @@
+"""
+Benchmark the apply_kernel backends in labs/utils.py to find the kernel sizes
+at which the separable, strided and FFT paths cross over.  The separable
+column filters a Gaussian, the strided and FFT columns a random dense kernel
+and the auto column both of them with the automatic choice.
+"""
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "labs"))
+from utils import apply_kernel, get_gaussian_factors, get_gaussian_filter  # noqa: E402
+
+
+def timed(image, kernel, backend, repeats=3):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = apply_kernel(image, kernel, backend)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(kernel_sizes=(3, 5, 7, 9, 11, 15, 21, 31)):
+    image = cv2.imread(str(ROOT / "dataset" / "UCL_21May91.jpg"))
+    image = cv2.resize(image, (1280, 800), interpolation=cv2.INTER_AREA)
+    rng = np.random.default_rng(0)
+    print(f"image {image.shape[1]}x{image.shape[0]}x{image.shape[2]}")
+
+    # the original per pixel loop, timed on a small crop and scaled up
+    crop = image[:64, :64]
+    loop_time, _ = timed(crop, get_gaussian_filter(5, 1.0), 'loop', repeats=1)
+    print(f"loop, 5x5: ~{loop_time * image.shape[0] * image.shape[1] / crop.shape[0] / crop.shape[1]:.1f}s "
+          f"(extrapolated from a {crop.shape[0]}x{crop.shape[1]} crop)")
+
+    # even kernels are anchored like odd ones and match the loop, including
+    # its zero last row and column
+    for kernel in (np.ones((2, 2)) / 4, np.array([[1.0, 0.0], [0.0, -1.0]]), rng.random((4, 4)),
+                   np.outer(rng.random(4), rng.random(4))):
+        _, reference = timed(crop, kernel, 'loop', repeats=1)
+        for backend in ('auto', 'strided', 'fft'):
+            assert np.allclose(apply_kernel(crop, kernel, backend), reference), \
+                f"{backend} disagrees with the loop for a {kernel.shape[0]}x{kernel.shape[0]} kernel"
+
+    print(f"{'size':>4} {'separable':>10} {'strided':>10} {'fft':>10} {'auto':>10}")
+    for size in kernel_sizes:
+        gaussian = get_gaussian_filter(size, size / 4)
+        dense = rng.random((size, size))
+        separable_time, separable = timed(image, get_gaussian_factors(size, size / 4), 'separable')
+        strided_time, strided = timed(image, dense, 'strided')
+        fft_time, fft = timed(image, dense, 'fft')
+        assert np.allclose(separable, apply_kernel(image, gaussian, 'strided'))
+        assert np.allclose(strided, fft)
+        auto_time = timed(image, gaussian, 'auto')[0] + timed(image, dense, 'auto')[0]
+        print(f"{size:4d} {separable_time:9.3f}s {strided_time:9.3f}s {fft_time:9.3f}s {auto_time:9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
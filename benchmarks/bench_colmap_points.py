@@ -0,0 +1,106 @@
+"""
+Startup cost of loading points3D.bin: the per-point objects of
+viser.extras.colmap.read_points3d_binary followed by the list comprehensions
+of ColmapVisualizer, against lab4a/colmap_arrays.read_points3d_arrays, on a
+synthetic reconstruction. Each reader runs in its own process so the peak
+resident set sizes are comparable.
+"""
+import argparse
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "lab4a"))
+from colmap_arrays import read_points3d_arrays  # noqa: E402
+
+Point3D = namedtuple("Point3D", ["id", "xyz", "rgb", "error", "image_ids", "point2D_idxs"])
+
+
+def read_points3d_objects(path):
+    """The reader of viser.extras.colmap (from COLMAP's read_write_model.py)."""
+    try:
+        from viser.extras.colmap import read_points3d_binary
+        return read_points3d_binary(path)
+    except ImportError:
+        pass
+    points3d = {}
+    with open(path, "rb") as fid:
+        num_points = struct.unpack("<Q", fid.read(8))[0]
+        for _ in range(num_points):
+            props = struct.unpack("<QdddBBBd", fid.read(43))
+            track_length = struct.unpack("<Q", fid.read(8))[0]
+            track = struct.unpack("<" + "ii" * track_length, fid.read(8 * track_length))
+            points3d[props[0]] = Point3D(id=props[0], xyz=np.array(props[1:4]), rgb=np.array(props[4:7]),
+                                         error=props[7], image_ids=np.array(track[0::2]),
+                                         point2D_idxs=np.array(track[1::2]))
+    return points3d
+
+
+def write_points3d(path, num_points, mean_track=6, seed=0):
+    rng = np.random.default_rng(seed)
+    track_lengths = rng.integers(2, 2 * mean_track - 1, num_points)
+    with open(path, "wb") as fid:
+        fid.write(struct.pack("<Q", num_points))
+        xyz = rng.normal(size=(num_points, 3))
+        rgb = rng.integers(0, 256, (num_points, 3))
+        for i in range(num_points):
+            fid.write(struct.pack("<QdddBBBdQ", i + 1, *xyz[i], *rgb[i], 0.5, track_lengths[i]))
+            fid.write(np.zeros(2 * track_lengths[i], dtype="<i4").tobytes())
+
+
+def load(reader, path):
+    """Time one reader and return (seconds, peak RSS in MB, points, colours)."""
+    start = time.perf_counter()
+    if reader == "objects":
+        points3d = read_points3d_objects(path)
+        points = np.array([points3d[p_id].xyz for p_id in points3d])
+        colors = np.array([points3d[p_id].rgb for p_id in points3d])
+    else:
+        points3d = read_points3d_arrays(path)
+        points, colors = points3d["xyz"], points3d["rgb"]
+    seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return seconds, peak_mb, points, colors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--reader", choices=["objects", "arrays"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.reader:
+        seconds, peak_mb, points, colors = load(args.reader, args.path)
+        print(f"{seconds} {peak_mb} {points.sum()} {colors.astype(int).sum()}")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "points3D.bin"
+        write_points3d(path, args.points)
+        print(f"{args.points} points, {path.stat().st_size / 2**20:.0f} MB points3D.bin")
+        # baseline RSS of the interpreter with numpy imported
+        idle = subprocess.run([sys.executable, "-c", "import resource, numpy; "
+                               "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)"],
+                              capture_output=True, text=True, check=True)
+        print(f"  python + numpy alone: {float(idle.stdout):.0f} MB peak RSS")
+        results = {}
+        for reader in ("objects", "arrays"):
+            out = subprocess.run([sys.executable, __file__, "--reader", reader, "--path", str(path)],
+                                 capture_output=True, text=True, check=True)
+            seconds, peak_mb, checksum, colour_sum = map(float, out.stdout.split())
+            results[reader] = (checksum, colour_sum)
+            print(f"  {reader:8s}: {seconds:6.2f} s, {peak_mb:6.0f} MB peak RSS")
+        assert np.allclose(results["objects"], results["arrays"]), "readers disagree"
+
+
+if __name__ == "__main__":
+    main()
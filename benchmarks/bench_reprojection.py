@@ -0,0 +1,69 @@
+"""
+Reprojection report of w3_calibration/reprojection.py against the per-view
+cv2.projectPoints loop, on the calibration images replicated to many views,
+and the outlier rejection loop on views with injected corner noise.
+"""
+import glob
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "w3_calibration"))
+from reprojection import calibrate_rejecting_outliers, reprojection_report  # noqa: E402
+from w3_calibration import board_points, derived_suffix, detect_corners  # noqa: E402
+
+
+def loop_error(objpoints, imgpoints, rvecs, tvecs, camera_matrix, dist_coeffs):
+    mean_error = 0
+    for i in range(len(objpoints)):
+        imgpoints2, _ = cv2.projectPoints(objpoints[i], rvecs[i], tvecs[i], camera_matrix, dist_coeffs)
+        mean_error += cv2.norm(imgpoints[i].reshape(-1, 2), imgpoints2.reshape(-1, 2), cv2.NORM_L2) / len(imgpoints2)
+    return mean_error / len(objpoints)
+
+
+def best_ms(function, args, repeats=5):
+    """Result and best time in ms of repeats calls after a warm-up call."""
+    result = function(*args)
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, 1e3 * best
+
+
+def main(repeats=(1, 10, 100)):
+    images = [f for f in sorted(glob.glob(str(ROOT / "w3_calibration" / "calibration_images" / "*.jpg")))
+              if not f.endswith(derived_suffix)]
+    detections = [d for d in detect_corners(images) if d[1] is not None]
+    imgpoints = [corners for _, corners, _ in detections]
+    objpoints = [board_points()] * len(imgpoints)
+    image_size = detections[0][2]
+    _, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, image_size, None, None)
+
+    for repeat in repeats:
+        args = (objpoints * repeat, imgpoints * repeat, list(rvecs) * repeat, list(tvecs) * repeat,
+                camera_matrix, dist_coeffs)
+        reference, loop_ms = best_ms(loop_error, args)
+        report, batched_ms = best_ms(reprojection_report, args)
+        print(f"{len(args[0]):5d} views: loop {loop_ms:7.2f} ms, batched {batched_ms:6.2f} ms "
+              f"({loop_ms / batched_ms:.1f}x), total error {reference:.6f} vs {report['mean_error']:.6f}")
+
+    # perturb a few views so the rejection loop has something to remove
+    rng = np.random.default_rng(0)
+    noisy = [corners.copy() for corners in imgpoints]
+    for i in rng.choice(len(noisy), 3, replace=False):
+        noisy[i] += rng.normal(0, 4, noisy[i].shape).astype(np.float32)
+    calibration, keep, history = calibrate_rejecting_outliers(objpoints, noisy, image_size)
+    for round_, step in enumerate(history):
+        print(f"round {round_}: {step['views']} views, RMS {step['rms']:.4f}, "
+              f"calibration {step['calibrate_time']:.3f}s, report {step['report_time'] * 1e3:.2f}ms")
+    print(f"kept {len(keep)} of {len(noisy)} views, final RMS {calibration[0]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
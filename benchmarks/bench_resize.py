@@ -0,0 +1,52 @@
+"""
+utils.resize against the old single INTER_LINEAR resize on a 4000x3000 colour
+image, and utils.load_image decoding straight to grey / reduced size against
+decoding to BGR and converting.
+"""
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "labs"))
+from utils import load_image, resize  # noqa: E402
+
+
+def timed(function, repeat=10):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, 1e3 * (time.perf_counter() - start) / repeat
+
+
+def main():
+    path = str(ROOT / "dataset" / "UCL_21May91.jpg")
+    big = cv2.resize(cv2.imread(path), (4000, 3000))
+    # aliasing probe: stripes with a period of about 2.2 pixels
+    x = np.arange(4000)
+    stripes = np.repeat(((np.sin(x * 2.9) > 0) * 255).astype(np.uint8)[np.newaxis], 3000, axis=0)
+
+    print("resize 4000x3000 BGR")
+    for scale in (50, 30, 13, 7):
+        size = (int(4000 * scale / 100), int(3000 * scale / 100))
+        _, linear_ms = timed(lambda: cv2.resize(big, size, interpolation=cv2.INTER_LINEAR))
+        _, area_ms = timed(lambda: cv2.resize(big, size, interpolation=cv2.INTER_AREA))
+        _, new_ms = timed(lambda: resize(big, scale))
+        aliased = cv2.resize(stripes, size, interpolation=cv2.INTER_LINEAR).std()
+        filtered = resize(stripes, scale).std()
+        print(f"  {scale:3d}%: INTER_LINEAR {linear_ms:5.1f} ms, INTER_AREA {area_ms:5.1f} ms, "
+              f"resize {new_ms:5.1f} ms; stripe residue std {aliased:5.1f} -> {filtered:4.1f}")
+
+    print("load_image", Path(path).name)
+    _, old_ms = timed(lambda: cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY))
+    print(f"  imread + cvtColor:  {old_ms:6.1f} ms")
+    for reduce in (1, 2, 4, 8):
+        image, ms = timed(lambda: load_image(path, reduce))
+        print(f"  load_image reduce={reduce}: {ms:6.1f} ms {image.shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Scaling benchmark for compute_disparity_map in labs/functions.py.
+
+The StereoData.mat pair is tiled up to a multi-megapixel image and the full
+disparity map is computed with an increasing number of worker processes.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.io import loadmat
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "labs"))
+from functions import compute_disparity_map  # noqa: E402
+
+
+def main(tiles=(8, 8), max_disp=10, alpha=1):
+    data = loadmat(ROOT / "dataset" / "StereoData.mat")
+    im1 = np.tile(data['im1'], tiles)
+    im2 = np.tile(data['im2'], tiles)
+    pairwise = alpha * np.ones([max_disp, max_disp]) - alpha * np.eye(max_disp)
+    megapixels = im1.size / 1e6
+    print(f"image {im1.shape[0]}x{im1.shape[1]} ({megapixels:.1f} MP), {max_disp} disparities")
+
+    counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    reference, serial_time = None, None
+    for workers in counts:
+        start = time.perf_counter()
+        disparity = compute_disparity_map(im1, im2, max_disp, pairwise, workers=workers)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference, serial_time = disparity, elapsed
+        assert np.array_equal(disparity, reference), "parallel result differs from the serial one"
+        print(f"{workers:3d} workers: {elapsed:.2f}s, {megapixels / elapsed:.2f} MP/s, "
+              f"speed-up {serial_time / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
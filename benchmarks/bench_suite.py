@@ -0,0 +1,243 @@
+"""
+Regression suite over the hot paths of the repository: scanline DP
+(labs/functions.py), apply_kernel, colourize and binarize (labs/utils.py), the
+w3_calibration pipeline and the ColmapVisualizer load path (points3D.bin
+reading, level-of-detail ordering and camera poses, without the viser server).
+
+Every case runs at several scales built from dataset/ and the calibration
+images: scale s tiles or resizes the inputs to s times the base size in each
+dimension, or multiplies the number of images or points by s. Wall time is the
+best of --repeats runs after a warm-up call, peak memory is the Python and
+NumPy heap of one more call under tracemalloc (OpenCV's internal buffers are
+not included).
+
+    python benchmarks/bench_suite.py --save              # write the baseline
+    python benchmarks/bench_suite.py                     # compare against it
+    python benchmarks/bench_suite.py --threshold 0.5 --cases dp calibration
+    python benchmarks/bench_suite.py --profile profiles  # cProfile every case
+
+The run fails (exit status 1) when a case is slower than its baseline by more
+than the threshold. Baselines are machine specific and are not committed.
+"""
+import argparse
+import cProfile
+import gc
+import glob
+import json
+import os
+import platform
+import pstats
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "labs"))
+sys.path.insert(0, str(ROOT / "w3_calibration"))
+sys.path.insert(0, str(ROOT / "lab4a"))
+from colmap_arrays import POINT3D_DTYPE, read_points3d_arrays, world_from_camera  # noqa: E402
+from datasets import load_dataset_image, load_mat  # noqa: E402
+from functions import dynamicProgramVec, stereoUnaryCosts  # noqa: E402
+from point_lod import lod_order  # noqa: E402
+from utils import apply_kernel, binarize, colourize, get_gaussian_filter, resize  # noqa: E402
+from w3_calibration import calibrate, derived_suffix  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_SCALES = (1, 2, 4)
+
+
+def grey_image(scale, width=320):
+    """ The UCL image resized to scale * width pixels wide """
+    image = load_dataset_image("UCL_21May91.jpg", reduce=4)
+    return resize(image, 100 * scale * width / image.shape[1])
+
+
+def case_dp(scale, max_disp=10, alpha=1):
+    data = load_mat("StereoData.mat")
+    im1, im2 = np.tile(data["im1"], (scale, scale)), np.tile(data["im2"], (scale, scale))
+    pairwise = alpha * np.ones([max_disp, max_disp]) - alpha * np.eye(max_disp)
+    return lambda: dynamicProgramVec(stereoUnaryCosts(im1, im2, max_disp, 6), pairwise), im1.size / 1e6, "Mpx"
+
+
+def case_apply_kernel(scale):
+    image = grey_image(scale)
+    kernel = get_gaussian_filter(7, 1.5)
+    return lambda: apply_kernel(image, kernel), image.size / 1e6, "Mpx"
+
+
+def case_colourize(scale):
+    image = grey_image(scale)
+    _, labels = cv2.connectedComponents(binarize(image, out=np.empty_like(image)))
+    out = np.empty(labels.shape + (3,), dtype=np.uint8)
+    return lambda: colourize(labels, out), labels.size / 1e6, "Mpx"
+
+
+def case_binarize(scale):
+    image = grey_image(4 * scale)
+    out = np.empty_like(image)
+    return lambda: binarize(image, out=out), image.size / 1e6, "Mpx"
+
+
+def case_calibration(scale, views=5):
+    images = [f for f in sorted(glob.glob(str(ROOT / "w3_calibration" / "calibration_images" / "*.jpg")))
+              if not f.endswith(derived_suffix)]
+    images = (images * scale)[:views * scale]
+    return lambda: calibrate(images, workers=1, output=None), len(images), "images"
+
+
+def write_points3d(path, num_points, track_length=4, seed=0):
+    """ Synthetic points3D.bin with fixed-length tracks, written in one go """
+    rng = np.random.default_rng(seed)
+    record = np.dtype(POINT3D_DTYPE.descr + [("track_length", "<u8"), ("track", "<i4", (2 * track_length,))])
+    points = np.zeros(num_points, dtype=record)
+    points["id"] = np.arange(1, num_points + 1)
+    points["xyz"] = rng.normal(size=(num_points, 3))
+    points["rgb"] = rng.integers(0, 256, (num_points, 3))
+    points["track_length"] = track_length
+    with open(path, "wb") as f:
+        f.write(np.uint64(num_points).tobytes())
+        f.write(points.tobytes())
+
+
+def case_colmap_load(scale, points=100_000, images=100):
+    tmp = tempfile.TemporaryDirectory()  # removed with the closure
+    path = Path(tmp.name) / "points3D.bin"
+    write_points3d(path, points * scale)
+    rng = np.random.default_rng(0)
+    qvecs = rng.normal(size=(images * scale, 4))
+    qvecs /= np.linalg.norm(qvecs, axis=1, keepdims=True)
+    tvecs = rng.normal(size=(images * scale, 3))
+
+    def load():
+        assert tmp is not None
+        points3d = read_points3d_arrays(path)
+        lod = lod_order(points3d["xyz"])
+        world_from_camera(qvecs, tvecs)
+        return points3d["xyz"][lod].astype(np.float32), points3d["rgb"][lod]
+
+    return load, points * scale / 1e6, "Mpoints"
+
+
+CASES = {
+    "dp": case_dp,
+    "apply_kernel": case_apply_kernel,
+    "colourize": case_colourize,
+    "binarize": case_binarize,
+    "calibration": case_calibration,
+    "colmap_load": case_colmap_load,
+}
+
+
+def measure(function, repeats, min_seconds=0.05):
+    """ Best wall time per call of repeats runs and the peak traced heap of one more call, in MB
+    Calls faster than min_seconds are looped within each run, as timeit does,
+    so that timer resolution and noise do not dominate the sub-millisecond cases.
+    """
+    start = time.perf_counter()
+    function()
+    first = time.perf_counter() - start
+    loops = max(1, int(np.ceil(min_seconds / max(first, 1e-9))))
+    seconds = np.inf
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        seconds = min(seconds, (time.perf_counter() - start) / loops)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def profile(function, path):
+    """ Save a cProfile of one run to path and return its stats """
+    profiler = cProfile.Profile()
+    profiler.runcall(function)
+    profiler.dump_stats(path)
+    return pstats.Stats(profiler)
+
+
+def machine():
+    return dict(platform=platform.platform(), processor=platform.processor() or platform.machine(),
+                cpus=os.cpu_count(), python=platform.python_version(), numpy=np.__version__,
+                opencv=cv2.__version__)
+
+
+def compare(results, baseline, threshold):
+    """ Print the change against baseline, return the names of the regressed cases """
+    regressed = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"  {name:20s} not in the baseline")
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        memory = result["peak_mb"] / max(baseline[name]["peak_mb"], 1e-6)
+        failed = ratio > 1 + threshold
+        print(f"  {name:20s} time x{ratio:5.2f}  memory x{memory:5.2f}{'  SLOWER' if failed else ''}")
+        if failed:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--scales", nargs="+", type=int, default=list(DEFAULT_SCALES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown as a fraction of the baseline time")
+    parser.add_argument("--profile", type=Path, metavar="DIR",
+                        help="Save a cProfile of every case to DIR/<case>-<scale>.prof")
+    parser.add_argument("--output", type=Path, help="Also write the results of this run to a JSON file")
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        args.profile.mkdir(parents=True, exist_ok=True)
+    results = {}
+    for case in args.cases:
+        for scale in args.scales:
+            name = f"{case}/{scale}"
+            function, items, unit = CASES[case](scale)
+            seconds, peak_mb = measure(function, args.repeats)
+            results[name] = dict(seconds=seconds, throughput=items / seconds, unit=f"{unit}/s", peak_mb=peak_mb)
+            print(f"{name:20s} {seconds * 1e3:9.1f} ms {items / seconds:10.2f} {unit}/s {peak_mb:8.1f} MB")
+            if args.profile is not None:
+                path = args.profile / f"{case}-{scale}.prof"
+                profile(function, path).sort_stats("cumulative").print_stats(8)
+                print(f"  profile saved to {path}")
+
+    report = dict(machine=machine(), repeats=args.repeats, results=results)
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, run with --save to create one")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("machine") != report["machine"]:
+        print("warning: the baseline was recorded on a different machine or software versions")
+    print(f"against {args.baseline} (threshold +{args.threshold:.0%}):")
+    regressed = compare(results, baseline["results"], args.threshold)
+    if regressed:
+        print(f"{len(regressed)} case(s) slower than the baseline: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Frustum texture loading in lab4a: full decode then stride (the old
+visualize_frames path) against lab4a/thumbnails.py, cold, from the on-disk
+cache and from memory, on JPEGs upscaled from the calibration images.
+"""
+import argparse
+import glob
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "lab4a"))
+from thumbnails import ThumbnailCache  # noqa: E402
+
+
+def timed(label, function, count):
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    print(f"  {label:24s} {seconds:6.2f} s ({1e3 * seconds / count:5.1f} ms/image)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--size", type=int, nargs=2, default=(3072, 2048))
+    parser.add_argument("--downsample", type=int, default=2)
+    args = parser.parse_args()
+
+    sources = sorted(glob.glob(str(ROOT / "w3_calibration" / "calibration_images" / "calibration_image_??.jpg")))
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.images):
+            path = Path(tmp) / f"image_{i:04d}.jpg"
+            Image.open(sources[i % len(sources)]).resize(tuple(args.size)).save(path, quality=90)
+            paths.append(path)
+        print(f"{args.images} {args.size[0]}x{args.size[1]} JPEGs, downsample factor {args.downsample}")
+
+        factor = args.downsample
+        full = timed("full decode + stride", lambda: [np.asarray(Image.open(p).convert("RGB"))[::factor, ::factor]
+                                                     for p in paths], len(paths))
+        cache = ThumbnailCache(factor, cache_dir=Path(tmp) / ".thumbnail_cache")
+        cold = timed("thumbnails, cold", lambda: cache.get_many(paths), len(paths))
+        timed("thumbnails, memory", lambda: cache.get_many(paths), len(paths))
+        disk = timed("thumbnails, disk cache", lambda: ThumbnailCache(factor, cache_dir=cache.cache_dir)
+                     .get_many(paths), len(paths))
+
+        assert all(np.array_equal(cold[p], disk[p]) for p in paths)
+        error = np.mean([np.abs(f.astype(int) - cold[p]).mean() for f, p in zip(full, paths)])
+        print(f"  mean difference to the strided image: {error:.2f} grey levels")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Per-frame latency of cv2.undistort against the cached remap tables of
+w3_calibration/undistort.py on 1280x800 frames.
+"""
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "w3_calibration"))
+from undistort import Undistorter  # noqa: E402
+
+
+def main(n_frames=200):
+    calibration = ROOT / "w3_calibration"
+    frame = cv2.imread(str(calibration / "calibration_images" / "calibration_image_02.jpg"))
+    frame = cv2.resize(frame, (1280, 800))
+    undistorter = Undistorter.from_file(calibration / "calibration_data.npz")
+    camera_matrix, dist_coeffs = undistorter.camera_matrix, undistorter.dist_coeffs
+    new_camera_matrix = undistorter.maps((1280, 800))[2]
+
+    latencies = []
+    for _ in range(n_frames):
+        start = time.perf_counter()
+        reference = cv2.undistort(frame, camera_matrix, dist_coeffs, None, new_camera_matrix)
+        latencies.append(time.perf_counter() - start)
+    undistort_ms = 1e3 * np.median(latencies)
+
+    out = np.empty_like(frame)
+    latencies = []
+    for _ in range(n_frames):
+        start = time.perf_counter()
+        undistorter(frame, out=out)
+        latencies.append(time.perf_counter() - start)
+    remap_ms = 1e3 * np.median(latencies)
+
+    diff = np.abs(out.astype(int) - reference).max()
+    print(f"{frame.shape[1]}x{frame.shape[0]}, median over {n_frames} frames")
+    print(f"cv2.undistort:      {undistort_ms:.2f} ms/frame")
+    print(f"Undistorter remap:  {remap_ms:.2f} ms/frame ({undistort_ms / remap_ms:.1f}x), "
+          f"max difference {diff} grey levels")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Readers for COLMAP binary reconstructions that return NumPy arrays.
+
+Unlike viser.extras.colmap, which builds one Python object per point, these
+readers memory-map the .bin file and copy the fields the visualizer needs
+straight into arrays, skipping the point tracks.
+"""
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+# Fixed-size head of a points3D.bin record, followed by the track length
+# (uint64) and track_length pairs of (image_id, point2D_idx) int32
+POINT3D_DTYPE = np.dtype([
+    ("id", "<u8"),
+    ("xyz", "<f8", (3,)),
+    ("rgb", "u1", (3,)),
+    ("error", "<f8"),
+])
+_TRACK_LENGTH = struct.Struct("<Q")
+_TRACK_ELEMENT_SIZE = 8
+
+# Records copied per gather, bounds the temporary index array to a few MB
+_CHUNK_POINTS = 1 << 16
+
+
+def _record_offsets(buffer, num_points, start):
+    """Byte offset of every record of a points3D.bin buffer.
+
+    Records have variable length, so the offsets are found by hopping over
+    the tracks; only the track lengths are read.
+    """
+    offsets = np.empty(num_points, dtype=np.int64)
+    unpack = _TRACK_LENGTH.unpack_from
+    head = POINT3D_DTYPE.itemsize
+    step = head + _TRACK_LENGTH.size
+    offset = start
+    for i in range(num_points):
+        offsets[i] = offset
+        offset += step + _TRACK_ELEMENT_SIZE * unpack(buffer, offset + head)[0]
+    return offsets
+
+
+def read_points3d_arrays(path: Path) -> np.ndarray:
+    """Read a COLMAP points3D.bin file into a structured array.
+
+    Args:
+        path: Path to points3D.bin.
+    Returns:
+        points (np.ndarray): One record per point with fields id (uint64),
+            xyz (3 float64), rgb (3 uint8) and error (float64). Tracks are
+            not read.
+    """
+    with open(path, "rb") as f:
+        if Path(path).stat().st_size == 0:
+            return np.empty(0, dtype=POINT3D_DTYPE)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            num_points = _TRACK_LENGTH.unpack_from(buffer, 0)[0]
+            offsets = _record_offsets(buffer, num_points, _TRACK_LENGTH.size)
+
+            data = np.frombuffer(buffer, dtype=np.uint8)
+            points = np.empty(num_points, dtype=POINT3D_DTYPE)
+            raw = points.view(np.uint8).reshape(num_points, POINT3D_DTYPE.itemsize)
+            head = np.arange(POINT3D_DTYPE.itemsize)
+            for start in range(0, num_points, _CHUNK_POINTS):
+                stop = min(start + _CHUNK_POINTS, num_points)
+                raw[start:stop] = data[offsets[start:stop, np.newaxis] + head]
+            del data  # release the buffer view before the mmap closes
+    return points
+
+
+# Camera models whose parameters start with a single focal length f, all
+# others start with fx, fy
+SINGLE_FOCAL_MODELS = {
+    "SIMPLE_PINHOLE",
+    "SIMPLE_RADIAL",
+    "RADIAL",
+    "SIMPLE_RADIAL_FISHEYE",
+    "RADIAL_FISHEYE",
+}
+
+
+def camera_fields(cameras: dict):
+    """Vertical field of view and aspect ratio of every camera.
+
+    Works for every COLMAP camera model, reading fy as params[0] for the
+    single focal length models and params[1] otherwise. Distortion is
+    ignored, which is what a frustum drawing needs.
+
+    Args:
+        cameras: Cameras by id, as returned by read_cameras_binary.
+    Returns:
+        (index, fov, aspect): index maps a camera id to its row of the
+        fov (radians) and aspect (width / height) arrays.
+    """
+    cams = list(cameras.values())
+    index = {cam.id: row for row, cam in enumerate(cams)}
+    models = np.array([cam.model for cam in cams])
+    width = np.array([cam.width for cam in cams], dtype=np.float64)
+    height = np.array([cam.height for cam in cams], dtype=np.float64)
+    focal = np.array([cam.params[:2] if len(cam.params) > 1 else (cam.params[0],) * 2 for cam in cams],
+                     dtype=np.float64).reshape(-1, 2)
+    fy = np.where(np.isin(models, list(SINGLE_FOCAL_MODELS)), focal[:, 0], focal[:, 1])
+    return index, 2 * np.arctan2(height / 2, fy), width / height
+
+
+def world_from_camera(qvecs: np.ndarray, tvecs: np.ndarray):
+    """Camera poses in the world from COLMAP's camera-from-world poses.
+
+    Args:
+        qvecs: (N, 4) rotations as wxyz quaternions.
+        tvecs: (N, 3) translations.
+    Returns:
+        (wxyz, positions): (N, 4) conjugated unit quaternions and (N, 3)
+        camera centres -R^T t, the batched equivalent of
+        tf.SE3.from_rotation_and_translation(tf.SO3(qvec), tvec).inverse().
+    """
+    qvecs = np.asarray(qvecs, dtype=np.float64).reshape(-1, 4)
+    tvecs = np.asarray(tvecs, dtype=np.float64).reshape(-1, 3)
+    wxyz = qvecs / np.linalg.norm(qvecs, axis=1, keepdims=True)
+    wxyz[:, 1:] *= -1
+
+    # rotate -t by the inverse rotation: v + 2w (u x v) + 2u x (u x v)
+    w, u = wxyz[:, :1], wxyz[:, 1:]
+    uv = np.cross(u, -tvecs)
+    positions = -tvecs + 2 * w * uv + 2 * np.cross(u, uv)
+    return wxyz, positions
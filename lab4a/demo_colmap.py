@@ -1,17 +1,66 @@
 """
 An example for running incremental SfM on images with the pycolmap interface.
+
+Run without arguments to pick a dataset interactively, or pass datasets to
+process them headless, e.g.
+
+    python demo_colmap.py fountain south-building path/to/images --report report.json
 """
+import argparse
+import json
+import os
+import platform
 import shutil
+import time
 import urllib.request
 import zipfile
+from contextlib import contextmanager
 from pathlib import Path
 import enlighten
 import pycolmap 
 from pycolmap import logging
-from visualizer import visualize_reconstruction  # Import the visualization function
+from matchers import MATCHERS, match, matching_options, select_matcher
+from stage_cache import StageCache, image_fingerprints, options_dict, stage_key
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Datasets known by name: (image folder below example/, download URL)
+DATASETS = {
+    "fountain": ("Fountain/images", "https://cvg-data.inf.ethz.ch/local-feature-evaluation-schoenberger2017/Strecha-Fountain.zip"),
+    "south-building": ("south-building/images", "https://demuc.de/colmap/datasets/south-building.zip"),
+}
+
+
+def available_threads():
+    """Number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
 
+def peak_rss_mb():
+    """Peak resident set size of the process so far in MB, None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if platform.system() == "Darwin" else peak / 1024
 
-def incremental_mapping_with_pbar(database_path, image_path, sfm_path):
+
+@contextmanager
+def measure(record):
+    """Add the wall and CPU seconds and the peak RSS of a stage to record."""
+    start, cpu_start = time.perf_counter(), time.process_time()
+    yield record
+    record.update(seconds=time.perf_counter() - start, cpu_seconds=time.process_time() - cpu_start,
+                  peak_rss_mb=peak_rss_mb())
+
+
+def incremental_mapping_with_pbar(database_path, image_path, sfm_path, num_threads=-1):
+    options = pycolmap.IncrementalPipelineOptions()
+    options.num_threads = num_threads
     num_images = pycolmap.Database(database_path).num_images
     with enlighten.Manager() as manager:
         with manager.counter(
@@ -22,12 +71,93 @@ def incremental_mapping_with_pbar(database_path, image_path, sfm_path):
                 database_path,
                 image_path,
                 sfm_path,
+                options=options,
                 initial_image_pair_callback=lambda: pbar.update(2),
                 next_image_callback=lambda: pbar.update(1),
             )
     return reconstructions
 
 
+def load_reconstructions(sfm_path):
+    """Reconstructions saved by an earlier incremental_mapping, by index."""
+    model_paths = [path for path in sfm_path.iterdir() if path.is_dir() and path.name.isdigit()]
+    return {int(path.name): pycolmap.Reconstruction(path) for path in sorted(model_paths)}
+
+
+def reconstruct(image_path, dataset_path, sift_options, matcher="auto", max_pairs_per_image=30,
+                vocab_tree_path=None, num_threads=-1):
+    """Extract, match and map the images, skipping the work done by earlier runs.
+
+    Stages are keyed by the image set and their options (see stage_cache.py):
+    new images only get their features extracted and are matched against the
+    existing ones, and mapping is skipped when nothing it depends on changed.
+
+    Returns the reconstructions by index and a dict of per-stage statistics,
+    including the wall and CPU seconds and the peak RSS after each stage.
+    """
+    database_path = dataset_path / "database.db"
+    sfm_path = dataset_path / "sfm"
+    images = image_fingerprints(image_path)
+    names = list(images)
+    cache = StageCache(dataset_path)
+    stats = dict(images=len(names))
+
+    # Feature extraction, only for images that are not in the database yet
+    extraction_options = options_dict(sift_options)
+    extraction_options.pop("num_threads", None)  # does not change the features
+    extraction_key = stage_key(extraction_options)
+    todo = cache.new_images("extraction", extraction_key, images)
+    if todo is None or not database_path.exists():
+        if database_path.exists():
+            database_path.unlink()
+        cache.invalidate("extraction", "matching", "mapping")
+        todo = names
+    with measure(dict(new_images=len(todo))) as stats["extraction"]:
+        if todo:
+            pycolmap.extract_features(database_path, image_path, image_list=todo, sift_options=sift_options)
+            cache.record("extraction", extraction_key, images)
+
+    # Matching with a matcher suited to the dataset, new pairs only
+    if matcher == "auto":
+        matcher = select_matcher(image_path, names)
+    options = matching_options(matcher, max_pairs_per_image, vocab_tree_path=vocab_tree_path)
+    matching_key = stage_key(extraction_key, matcher, options_dict(options))
+    todo = cache.new_images("matching", matching_key, images)
+    if todo is None:
+        if cache.images("matching"):
+            # matched with other options before, start from a clean slate
+            database = pycolmap.Database(database_path)
+            database.clear_matches()
+            database.clear_two_view_geometries()
+        cache.invalidate("matching", "mapping")
+        todo = names
+    with measure(dict(matcher=matcher, pairs=0)) as stats["matching"]:
+        if todo:
+            stats["matching"].update(match(database_path, matcher, options, num_threads))
+            cache.record("matching", matching_key, images)
+            logging.info(f"{matcher} matching: {stats['matching']['pairs']} image pairs "
+                         f"({stats['matching']['matches']} feature matches), "
+                         f"{stats['matching']['pairs_per_second']:.1f} pairs/s")
+
+    # Incremental mapping, unless the matches are the ones of the saved models
+    mapping_key = stage_key(matching_key, images)
+    with measure({}) as stats["mapping"]:
+        recs = load_reconstructions(sfm_path) if cache.key("mapping") == mapping_key and sfm_path.exists() else {}
+        stats["mapping"]["cached"] = bool(recs)
+        if not recs:
+            if sfm_path.exists():
+                shutil.rmtree(sfm_path)
+            sfm_path.mkdir(exist_ok=True)
+            recs = incremental_mapping_with_pbar(database_path, image_path, sfm_path, num_threads)
+            cache.record("mapping", mapping_key, images)
+
+    registered = max((rec.num_reg_images() for rec in recs.values()), default=0)
+    stats["mapping"].update(registered_images=registered,
+                            registration_rate=registered / len(names) if names else 0.0)
+    logging.info(f"Registered {registered} of {len(names)} images with {matcher} matching")
+    return recs, stats
+
+
 def choose_dataset():
     print("Choose a dataset:")
     print("1. Fountain (will download if not found)")
@@ -37,27 +167,26 @@ def choose_dataset():
     choice = input("Enter choice (1-3): ")
     
     if choice == '1':
-        return "fountain", "Fountain/images", "https://cvg-data.inf.ethz.ch/local-feature-evaluation-schoenberger2017/Strecha-Fountain.zip"
+        return ("fountain",) + DATASETS["fountain"]
     elif choice == '2':
-        return "south-building", "south-building/images", "https://demuc.de/colmap/datasets/south-building.zip"
+        return ("south-building",) + DATASETS["south-building"]
     elif choice == '3':
         custom_path = input("Enter path to image folder: ")
         folder_name = Path(custom_path).name
         return folder_name, custom_path, None
     else:
         print("Invalid choice, defaulting to Fountain")
-        return "fountain", "Fountain/images", "https://cvg-data.inf.ethz.ch/local-feature-evaluation-schoenberger2017/Strecha-Fountain.zip"
+        return ("fountain",) + DATASETS["fountain"]
 
 
-def run():
-    base_path = Path(__file__).resolve().parent / "example"
-    dataset_name, image_dir, data_url = choose_dataset()
-    
+def prepare_dataset(base_path, dataset_name, image_dir, data_url):
+    """Create the dataset folder, download the images if needed and set up logging.
+
+    Returns (dataset_path, image_path).
+    """
     # Create dataset-specific paths
     dataset_path = base_path / dataset_name
     image_path = base_path / image_dir
-    database_path = dataset_path / "database.db"
-    sfm_path = dataset_path / "sfm"
 
     # Create necessary directories
     base_path.mkdir(exist_ok=True)
@@ -73,33 +202,38 @@ def run():
         with zipfile.ZipFile(zip_path, "r") as fid:
             fid.extractall(base_path)
         logging.info(f"Data extracted to {base_path}.")
+    return dataset_path, image_path
 
-    if database_path.exists():
-        database_path.unlink()
-    pycolmap.set_random_seed(0)
+
+def sift_extraction_options(num_threads=8, max_image_size=640, max_num_features=1000):
     # SIFT extraction options
     # Initialize an empty SiftExtractionOptions instance
     sift_extraction_options = pycolmap.SiftExtractionOptions()
 
     # Assign individual options
-    sift_extraction_options.num_threads = 8
-    sift_extraction_options.max_image_size = 640
-    sift_extraction_options.max_num_features = 1000  # Increased to detect more features
+    sift_extraction_options.num_threads = num_threads
+    sift_extraction_options.max_image_size = max_image_size
+    sift_extraction_options.max_num_features = max_num_features  # Increased to detect more features
 
     sift_extraction_options.normalization = pycolmap.Normalization.L1_ROOT
+    return sift_extraction_options
 
-    pycolmap.extract_features(database_path, image_path, sift_options=sift_extraction_options)
 
-    MatchingOptions = pycolmap.ExhaustiveMatchingOptions()
-    MatchingOptions.block_size = 150
-    pycolmap.match_exhaustive(database_path,matching_options=MatchingOptions)
+def run():
+    base_path = Path(__file__).resolve().parent / "example"
+    dataset_name, image_dir, data_url = choose_dataset()
+    dataset_path, image_path = prepare_dataset(base_path, dataset_name, image_dir, data_url)
+    sfm_path = dataset_path / "sfm"
 
-    if sfm_path.exists():
-        shutil.rmtree(sfm_path)
-    sfm_path.mkdir(exist_ok=True)
+    pycolmap.set_random_seed(0)
 
-    recs = incremental_mapping_with_pbar(database_path, image_path, sfm_path)
+    # Extraction, matching and mapping, reusing what earlier runs computed
+    recs, stats = reconstruct(image_path, dataset_path, sift_extraction_options())
+    print(f"Matching: {stats['matching']['matcher']}, {stats['matching']['pairs']} new image pairs; "
+          f"registered {stats['mapping']['registered_images']} of {stats['images']} images")
     
+    from visualizer import visualize_reconstruction  # Import the visualization function
+
     for idx, rec in recs.items():
         logging.info(f"#{idx} {rec.summary()}")
         # Launch visualization for this reconstruction
@@ -108,5 +242,90 @@ def run():
         visualize_reconstruction(reconstruction_path, image_path)
 
 
+def run_batch(args):
+    """Reconstruct every dataset of args.datasets without user interaction.
+
+    Writes a JSON report with the options, the machine and, per dataset, the
+    timing and peak memory of every stage and the registered images of every
+    model. Returns the report.
+    """
+    base_path = Path(__file__).resolve().parent / "example"
+    report = dict(
+        machine=dict(platform=platform.platform(), python=platform.python_version(),
+                     pycolmap=getattr(pycolmap, "__version__", None), cpus=os.cpu_count(),
+                     available_threads=available_threads()),
+        options=dict(threads=args.threads, max_image_size=args.max_image_size, max_features=args.max_features,
+                     matcher=args.matcher, max_pairs=args.max_pairs),
+        datasets=[],
+    )
+    visualize = []
+
+    for dataset in args.datasets:
+        if dataset in DATASETS:
+            dataset_name, (image_dir, data_url) = dataset, DATASETS[dataset]
+        else:
+            image_dir, data_url = Path(dataset).resolve(), None
+            dataset_name = image_dir.name if image_dir.name != "images" else image_dir.parent.name
+        dataset_path, image_path = prepare_dataset(base_path, dataset_name, image_dir, data_url)
+
+        pycolmap.set_random_seed(0)
+        start = time.perf_counter()
+        recs, stats = reconstruct(image_path, dataset_path,
+                                  sift_extraction_options(args.threads, args.max_image_size, args.max_features),
+                                  args.matcher, args.max_pairs, args.vocab_tree, args.threads)
+        stats.update(
+            name=dataset_name,
+            image_path=str(image_path),
+            seconds=time.perf_counter() - start,
+            peak_rss_mb=peak_rss_mb(),
+            models=[dict(index=idx, registered_images=rec.num_reg_images(), points3D=rec.num_points3D(),
+                         mean_reprojection_error=rec.compute_mean_reprojection_error())
+                    for idx, rec in recs.items()],
+        )
+        report["datasets"].append(stats)
+        print(f"{dataset_name}: {stats['mapping']['registered_images']} of {stats['images']} images registered "
+              f"in {stats['seconds']:.1f}s (extraction {stats['extraction']['seconds']:.1f}s, "
+              f"{stats['matching']['matcher']} matching {stats['matching']['seconds']:.1f}s, "
+              f"mapping {stats['mapping']['seconds']:.1f}s)")
+
+        # Write the report after every dataset so a failure keeps the earlier ones
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(report, indent=2))
+        if recs:
+            best = max(recs, key=lambda idx: recs[idx].num_reg_images())
+            visualize.append((dataset_path / "sfm" / str(best), image_path))
+
+    print(f"Report written to {args.report}")
+    if args.visualize and visualize:
+        # The visualizer serves until interrupted, so only the last dataset is shown
+        from visualizer import visualize_reconstruction
+        visualize_reconstruction(*visualize[-1])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental SfM with pycolmap.")
+    parser.add_argument("datasets", nargs="*",
+                        help=f"Dataset names ({', '.join(DATASETS)}) or image folders; "
+                             "without any, choose one interactively")
+    parser.add_argument("--threads", type=int, default=available_threads(),
+                        help="Threads for extraction, matching and mapping, all available CPUs by default")
+    parser.add_argument("--max-image-size", type=int, default=640)
+    parser.add_argument("--max-features", type=int, default=1000)
+    parser.add_argument("--matcher", choices=MATCHERS, default="auto")
+    parser.add_argument("--max-pairs", type=int, default=30, help="Candidate pairs per image of the capped matchers")
+    parser.add_argument("--vocab-tree", type=Path, default=None, help="Vocabulary tree for retrieval matching")
+    parser.add_argument("--report", type=Path, default=Path(__file__).resolve().parent / "example" / "report.json",
+                        help="JSON timing and resource report of the batch run")
+    parser.add_argument("--visualize", action="store_true",
+                        help="Show the largest model of the last dataset when the batch is done")
+    args = parser.parse_args()
+
+    if not args.datasets:
+        run()
+    else:
+        run_batch(args)
+
+
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    main()
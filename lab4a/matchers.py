@@ -0,0 +1,138 @@
+"""
+Matcher selection for demo_colmap.py.
+
+Exhaustive matching compares every pair of images, which is quadratic in the
+number of images. select_matcher keeps it for small datasets and otherwise
+picks a matcher that compares each image with a bounded number of candidates:
+sequential for video-like captures, spatial for geotagged images and
+retrieval (vocabulary tree) for everything else.
+"""
+import re
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import pycolmap
+from PIL import Image
+
+MATCHERS = ("auto", "exhaustive", "sequential", "spatial", "vocabtree")
+
+# Datasets up to this many images are matched exhaustively by "auto"
+EXHAUSTIVE_LIMIT = 200
+
+# EXIF tag of the GPS block
+GPS_INFO_TAG = 0x8825
+
+
+def is_sequential(image_names: List[str], min_fraction: float = 0.9) -> bool:
+    """Whether the images look like frames of a video.
+
+    True when nearly all names share a prefix and end in a frame number, and
+    the numbers mostly increase by one in name order (frame_000123.jpg).
+    """
+    numbers = {}
+    for name in image_names:
+        match = re.fullmatch(r"(.*?)(\d+)", Path(name).stem)
+        if match:
+            numbers.setdefault(str(Path(name).parent / match.group(1)), []).append(int(match.group(2)))
+    if not numbers or sum(map(len, numbers.values())) < min_fraction * len(image_names):
+        return False
+    steps = [b - a for frames in numbers.values() for a, b in zip(sorted(frames), sorted(frames)[1:])]
+    return bool(steps) and sum(step == 1 for step in steps) >= min_fraction * len(steps)
+
+
+def has_gps(image_path: Path, image_names: List[str], samples: int = 5) -> bool:
+    """Whether the first images carry EXIF GPS positions."""
+    for name in image_names[:samples]:
+        try:
+            with Image.open(image_path / name) as image:
+                if not image.getexif().get_ifd(GPS_INFO_TAG):
+                    return False
+        except OSError:
+            return False
+    return bool(image_names)
+
+
+def select_matcher(image_path: Path, image_names: List[str], exhaustive_limit: int = EXHAUSTIVE_LIMIT) -> str:
+    """Pick a matcher from the size and naming of the dataset."""
+    if len(image_names) <= exhaustive_limit:
+        return "exhaustive"
+    if is_sequential(image_names):
+        return "sequential"
+    if has_gps(image_path, image_names):
+        return "spatial"
+    return "vocabtree"
+
+
+def matching_options(matcher: str, max_pairs_per_image: int = 30, block_size: int = 150,
+                     vocab_tree_path: Optional[Path] = None):
+    """pycolmap options of a matcher, capping the candidate pairs per image.
+
+    Exhaustive matching is not capped, select_matcher only uses it for small
+    datasets.
+    """
+    if matcher == "exhaustive":
+        options = pycolmap.ExhaustiveMatchingOptions()
+        options.block_size = block_size
+    elif matcher == "sequential":
+        options = pycolmap.SequentialMatchingOptions()
+        options.overlap = max_pairs_per_image
+        options.quadratic_overlap = False
+        if vocab_tree_path is not None:
+            options.loop_detection = True
+            options.vocab_tree_path = str(vocab_tree_path)
+    elif matcher == "spatial":
+        options = pycolmap.SpatialMatchingOptions()
+        options.max_num_neighbors = max_pairs_per_image
+    elif matcher == "vocabtree":
+        options = pycolmap.VocabTreeMatchingOptions()
+        options.num_images = max_pairs_per_image
+        if vocab_tree_path is not None:
+            options.vocab_tree_path = str(vocab_tree_path)
+    else:
+        raise ValueError(f"Unknown matcher {matcher!r}, expected one of {MATCHERS}")
+    return options
+
+
+def match_counts(database_path: Path):
+    """Image pairs with matches, and the feature matches summed over them.
+
+    Database.num_matches counts feature correspondences, so the image pairs
+    come from num_matched_image_pairs.
+    """
+    database = pycolmap.Database(database_path)
+    try:
+        return database.num_matched_image_pairs, database.num_matches
+    finally:
+        database.close()
+
+
+def match(database_path: Path, matcher: str, options, num_threads: int = -1) -> dict:
+    """Run a matcher on the database and measure its throughput.
+
+    COLMAP skips image pairs that already have matches in the database, so
+    after adding images only their pairs are matched.
+
+    Returns a dict with the matcher, the image pairs added to the database
+    (pairs), the total (total_pairs), the feature matches added (matches),
+    seconds and pairs_per_second.
+    """
+    sift_options = pycolmap.SiftMatchingOptions()
+    sift_options.num_threads = num_threads
+    pairs_before, matches_before = match_counts(database_path)
+    start = time.perf_counter()
+    if matcher == "exhaustive":
+        pycolmap.match_exhaustive(database_path, sift_options=sift_options, matching_options=options)
+    elif matcher == "sequential":
+        pycolmap.match_sequential(database_path, sift_options=sift_options, matching_options=options)
+    elif matcher == "spatial":
+        pycolmap.match_spatial(database_path, sift_options=sift_options, matching_options=options)
+    elif matcher == "vocabtree":
+        pycolmap.match_vocabtree(database_path, sift_options=sift_options, matching_options=options)
+    else:
+        raise ValueError(f"Unknown matcher {matcher!r}, expected one of {MATCHERS}")
+    seconds = time.perf_counter() - start
+    total_pairs, total_matches = match_counts(database_path)
+    pairs = total_pairs - pairs_before
+    return dict(matcher=matcher, pairs=pairs, total_pairs=total_pairs, matches=total_matches - matches_before,
+                seconds=seconds, pairs_per_second=pairs / seconds if seconds > 0 else 0.0)
@@ -0,0 +1,81 @@
+"""
+Level-of-detail ordering of point clouds.
+
+lod_order sorts a cloud so that every prefix is a spatially uniform subset:
+the first points cover the scene coarsely and later points refine it. A point
+budget then becomes a slice points[:n], which is stable as the budget changes.
+"""
+import numpy as np
+
+
+def _spread_bits(values):
+    """Insert two zero bits after each of the low 21 bits of values (uint64)."""
+    values = values & np.uint64(0x1FFFFF)
+    for shift, mask in ((32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF), (8, 0x100F00F00F00F00F),
+                        (4, 0x10C30C30C30C30C3), (2, 0x1249249249249249)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton_codes(voxels):
+    """Interleave the bits of (N, 3) integer voxel coordinates below 2^21."""
+    voxels = np.asarray(voxels).astype(np.uint64)
+    return (_spread_bits(voxels[:, 0]) << np.uint64(2)) | (_spread_bits(voxels[:, 1]) << np.uint64(1)) \
+        | _spread_bits(voxels[:, 2])
+
+
+def lod_order(points: np.ndarray, max_level: int = 16, seed: int = 0) -> np.ndarray:
+    """Permutation of points in coarse-to-fine voxel-grid order.
+
+    Level l splits the bounding cube of the cloud into 2^l voxels per axis.
+    Every level adds one point from each occupied voxel that no earlier point
+    falls in. Points get a fixed random priority from seed, which picks the
+    point of a voxel and orders the points within a level, so a prefix cut in
+    the middle of a level is still spread over the whole scene. Points left
+    after max_level follow in priority order.
+
+    Sorting by Morton code once makes every voxel of every level a contiguous
+    run, so each level costs a few O(N) reductions instead of a sort.
+
+    Args:
+        points: (N, 3) point positions.
+        max_level: Finest level, at most 21.
+        seed: Seed of the priorities, the order is deterministic.
+    Returns:
+        order (np.ndarray): (N,) int64 indices into points.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    num_points = len(points)
+    if num_points == 0:
+        return np.empty(0, dtype=np.int64)
+    max_level = min(max_level, 21)
+
+    lower = points.min(axis=0)
+    extent = max(float((points.max(axis=0) - lower).max()), np.finfo(np.float64).tiny)
+    voxels = np.minimum((points - lower) / extent * (1 << max_level), (1 << max_level) - 1)
+    codes = morton_codes(voxels)
+    by_code = np.argsort(codes, kind="stable")
+    codes = codes[by_code]
+
+    # priority[i] is the rank of the i-th point in Morton order, by_rank inverts it
+    priority = np.random.default_rng(seed).permutation(num_points)
+    by_rank = np.empty(num_points, dtype=np.int64)
+    by_rank[priority] = np.arange(num_points)
+
+    unpicked = np.ones(num_points, dtype=bool)
+    order = []
+    for level in range(max_level + 1):
+        voxel = codes >> np.uint64(3 * (max_level - level))
+        starts = np.flatnonzero(np.concatenate(([True], voxel[1:] != voxel[:-1])))
+        # a voxel is free when all its points are unpicked, then take its top priority point
+        free = np.logical_and.reduceat(unpicked, starts)
+        ranks = np.minimum.reduceat(np.where(unpicked, priority, num_points), starts)[free]
+        ranks.sort()
+        chosen = by_rank[ranks]
+        unpicked[chosen] = False
+        order.append(by_code[chosen])
+        if not unpicked.any():
+            break
+
+    order.append(by_code[by_rank[np.sort(priority[unpicked])]])
+    return np.concatenate(order)
@@ -0,0 +1,74 @@
+"""
+Bookkeeping for skipping unchanged stages of the SfM pipeline in demo_colmap.py.
+
+Each stage (extraction, matching, mapping) records in stages.json the key it
+was run with and the images it covered. A stage is rerun only when its key
+changes, and extraction and matching only process images they have not seen.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"}
+
+
+def image_fingerprints(image_path: Path) -> Dict[str, str]:
+    """Relative name -> "size:mtime" of every image below image_path."""
+    fingerprints = {}
+    for path in sorted(Path(image_path).rglob("*")):
+        if path.suffix.lower() in IMAGE_EXTENSIONS and path.is_file():
+            stat = path.stat()
+            fingerprints[path.relative_to(image_path).as_posix()] = f"{stat.st_size}:{stat.st_mtime_ns}"
+    return fingerprints
+
+
+def options_dict(options) -> dict:
+    """Plain dict of a pycolmap options object, for hashing."""
+    if hasattr(options, "todict"):
+        return options.todict()
+    return {name: getattr(options, name) for name in dir(options)
+            if not name.startswith("_") and not callable(getattr(options, name))}
+
+
+def stage_key(*parts) -> str:
+    """Hash of the values a stage depends on."""
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class StageCache:
+    def __init__(self, dataset_path: Path):
+        """Stage records of one dataset, stored in dataset_path/stages.json."""
+        self.path = Path(dataset_path) / "stages.json"
+        self.stages = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def key(self, stage: str):
+        return self.stages.get(stage, {}).get("key")
+
+    def images(self, stage: str) -> Dict[str, str]:
+        """Fingerprints of the images the stage has processed with its key."""
+        return self.stages.get(stage, {}).get("images", {})
+
+    def record(self, stage: str, key: str, images: Dict[str, str]):
+        """Mark the stage done for images with key and save the records."""
+        self.stages[stage] = dict(key=key, images=images)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(self.stages, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.path)
+
+    def invalidate(self, *stages: str):
+        for stage in stages:
+            self.stages.pop(stage, None)
+
+    def new_images(self, stage: str, key: str, images: Dict[str, str]) -> Optional[List[str]]:
+        """Images the stage still has to process, or None if it must start over.
+
+        The stage starts over when its key changed or an image it processed
+        was modified or removed.
+        """
+        done = self.images(stage)
+        if self.key(stage) != key or any(images.get(name) != fingerprint for name, fingerprint in done.items()):
+            return None
+        return [name for name in images if name not in done]
@@ -0,0 +1,101 @@
+"""
+Downsampled frustum textures decoded in parallel and cached in memory and on disk.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from PIL import Image
+
+
+def decode_thumbnail(path: Path, downsample_factor: int) -> np.ndarray:
+    """Decode an image at 1 / downsample_factor of its size.
+
+    The result has the shape of image[::downsample_factor, ::downsample_factor].
+    JPEGs are decoded at reduced size straight from the DCT coefficients
+    (Image.draft) and only then resized, so full-resolution pixels are never
+    produced.
+    """
+    with Image.open(path) as image:
+        width, height = image.size
+        size = (-(-width // downsample_factor), -(-height // downsample_factor))
+        if downsample_factor > 1:
+            image.draft("RGB", size)
+        image = image.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return np.asarray(image)
+
+
+class ThumbnailCache:
+    def __init__(
+        self,
+        downsample_factor: int = 2,
+        cache_dir: Optional[Path] = None,
+        max_items: int = 512,
+        workers: Optional[int] = None,
+    ):
+        """Thumbnails keyed by image path and modification time.
+
+        Args:
+            downsample_factor: Downsample factor for the images.
+            cache_dir: Directory of the on-disk .npy cache, None to keep
+                thumbnails in memory only.
+            max_items: Number of thumbnails kept in the in-memory LRU.
+            workers: Number of decoding threads, from the CPU count by default.
+        """
+        self.downsample_factor = downsample_factor
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_items = max_items
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, path: Path) -> str:
+        stat = path.stat()
+        name = f"{path.resolve()}:{stat.st_mtime_ns}:{stat.st_size}:{self.downsample_factor}"
+        return hashlib.sha1(name.encode()).hexdigest()
+
+    def get(self, path: Path) -> np.ndarray:
+        """Thumbnail of one image, decoding it only if it is in neither cache."""
+        path = Path(path)
+        key = self._key(path)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        thumbnail = None
+        cache_path = self.cache_dir / f"{key}.npy" if self.cache_dir is not None else None
+        if cache_path is not None and cache_path.exists():
+            try:
+                thumbnail = np.load(cache_path)
+            except (OSError, ValueError):
+                thumbnail = None  # partially written entry, decode again
+        if thumbnail is None:
+            thumbnail = decode_thumbnail(path, self.downsample_factor)
+            if cache_path is not None:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix(f".{threading.get_ident()}.tmp.npy")
+                np.save(tmp_path, thumbnail)
+                os.replace(tmp_path, cache_path)
+
+        with self._lock:
+            self._memory[key] = thumbnail
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+        return thumbnail
+
+    def get_many(self, paths: Iterable[Path]) -> Dict[Path, np.ndarray]:
+        """Thumbnails of several images, decoded on a thread pool."""
+        paths = list(paths)
+        if len(paths) < 2:
+            return {path: self.get(path) for path in paths}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(paths, pool.map(self.get, paths)))
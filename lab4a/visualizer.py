@@ -2,22 +2,24 @@
 Visualization library for COLMAP sparse reconstruction outputs.
 """
 import random
-import time
+import threading
 from pathlib import Path
-from typing import List
+from typing import Dict, Optional
 
-import imageio.v3 as iio
 import numpy as np
 import viser
 import viser.transforms as tf
 from viser.extras.colmap import (
     read_cameras_binary,
     read_images_binary,
-    read_points3d_binary,
 )
 from tqdm.auto import tqdm
 import webbrowser
 
+from colmap_arrays import camera_fields, read_points3d_arrays, world_from_camera
+from point_lod import lod_order
+from thumbnails import ThumbnailCache
+
 
 class ColmapVisualizer:
     def __init__(
@@ -25,6 +27,7 @@ class ColmapVisualizer:
         colmap_path: Path,
         images_path: Path,
         downsample_factor: int = 2,
+        thumbnail_cache: Optional[Path] = None,
     ):
         """Initialize the COLMAP visualizer.
 
@@ -32,33 +35,55 @@ class ColmapVisualizer:
             colmap_path: Path to the COLMAP reconstruction directory.
             images_path: Path to the COLMAP images directory.
             downsample_factor: Downsample factor for the images.
+            thumbnail_cache: Directory of the on-disk frustum texture cache,
+                .thumbnail_cache next to images_path by default.
         """
         self.colmap_path = colmap_path
         self.images_path = images_path
         self.downsample_factor = downsample_factor
+        self.thumbnails = ThumbnailCache(
+            downsample_factor,
+            cache_dir=thumbnail_cache or Path(images_path).parent / ".thumbnail_cache",
+        )
         self.server = viser.ViserServer()
         self.server.gui.configure_theme(titlebar_content=None, control_layout="collapsible")
         
         # Load COLMAP data
         self.cameras = read_cameras_binary(colmap_path / "cameras.bin")
         self.images = read_images_binary(colmap_path / "images.bin")
-        self.points3d = read_points3d_binary(colmap_path / "points3D.bin")
+        self.points3d = read_points3d_arrays(colmap_path / "points3D.bin")
+
+        # Precompute frustum shapes of all cameras and world poses of all images
+        self.camera_index, self.camera_fov, self.camera_aspect = camera_fields(self.cameras)
+        self.frame_index = {img_id: row for row, img_id in enumerate(self.images)}
+        self.frame_wxyz, self.frame_positions = world_from_camera(
+            np.array([img.qvec for img in self.images.values()]).reshape(-1, 4),
+            np.array([img.tvec for img in self.images.values()]).reshape(-1, 3),
+        )
         
         # Initialize GUI elements
         self._setup_gui()
         
-        # Initialize visualization elements
-        self.points = np.array([self.points3d[p_id].xyz for p_id in self.points3d])
-        self.colors = np.array([self.points3d[p_id].rgb for p_id in self.points3d])
-        self.frames: List[viser.FrameHandle] = []
-        self.need_update = True
+        # Initialize visualization elements, in level-of-detail order so that
+        # any point budget is a spatially uniform prefix
+        lod = lod_order(self.points3d["xyz"])
+        self.points = self.points3d["xyz"][lod].astype(np.float32)
+        self.colors = self.points3d["rgb"][lod]
+        self.frames: Dict[int, viser.FrameHandle] = {}
+        self.update_event = threading.Event()
+        self.update_event.set()
+
+        # Fixed random order of the images that exist, "Max frames" shows a prefix
+        self.frame_order = sorted(
+            img.id for img in self.images.values() if (images_path / img.name).exists()
+        )
+        random.Random(0).shuffle(self.frame_order)
         
         # Initialize point cloud
-        point_mask = np.random.choice(self.points.shape[0], self.gui_points.value, replace=False)
         self.point_cloud = self.server.scene.add_point_cloud(
             name="/colmap/pcd",
-            points=self.points[point_mask],
-            colors=self.colors[point_mask],
+            points=self.points[: self.gui_points.value],
+            colors=self.colors[: self.gui_points.value],
             point_size=self.gui_point_size.value,
         )
 
@@ -102,29 +127,28 @@ class ColmapVisualizer:
         # Set up GUI callbacks
         @self.gui_points.on_update
         def _(_) -> None:
-            point_mask = np.random.choice(self.points.shape[0], self.gui_points.value, replace=False)
-            self.point_cloud.points = self.points[point_mask]
-            self.point_cloud.colors = self.colors[point_mask]
+            self.point_cloud.points = self.points[: self.gui_points.value]
+            self.point_cloud.colors = self.colors[: self.gui_points.value]
 
         @self.gui_frames.on_update
         def _(_) -> None:
-            self.need_update = True
+            self.update_event.set()
 
         @self.gui_point_size.on_update
         def _(_) -> None:
             self.point_cloud.point_size = self.gui_point_size.value
 
     def visualize_frames(self):
-        """Send all COLMAP elements to viser for visualization."""
-        # Remove existing image frames
-        for frame in self.frames:
-            frame.remove()
-        self.frames.clear()
+        """Add and remove camera frames to match the "Max frames" slider.
 
-        # Interpret the images and cameras
-        img_ids = [im.id for im in self.images.values()]
-        random.shuffle(img_ids)
-        img_ids = sorted(img_ids[: self.gui_frames.value])
+        Only frames entering or leaving the first gui_frames.value entries of
+        frame_order are sent, frames already shown are left untouched.
+        """
+        wanted = self.frame_order[: self.gui_frames.value]
+        wanted_set = set(wanted)
+        for img_id in [img_id for img_id in self.frames if img_id not in wanted_set]:
+            self.frames.pop(img_id).remove()
+        img_ids = [img_id for img_id in wanted if img_id not in self.frames]
 
         def attach_callback(
             frustum: viser.CameraFrustumHandle, frame: viser.FrameHandle
@@ -135,50 +159,40 @@ class ColmapVisualizer:
                     client.camera.wxyz = frame.wxyz
                     client.camera.position = frame.position
 
+        # Decode the new images in parallel
+        thumbnails = self.thumbnails.get_many(self.images_path / self.images[img_id].name for img_id in img_ids)
+
         for img_id in tqdm(img_ids):
             img = self.images[img_id]
-            cam = self.cameras[img.camera_id]
-
-            # Skip images that don't exist
+            row = self.frame_index[img_id]
+            cam_row = self.camera_index[img.camera_id]
             image_filename = self.images_path / img.name
-            if not image_filename.exists():
-                continue
 
-            T_world_camera = tf.SE3.from_rotation_and_translation(
-                tf.SO3(img.qvec), img.tvec
-            ).inverse()
             frame = self.server.scene.add_frame(
                 f"/colmap/frame_{img_id}",
-                wxyz=T_world_camera.rotation().wxyz,
-                position=T_world_camera.translation(),
+                wxyz=self.frame_wxyz[row],
+                position=self.frame_positions[row],
                 axes_length=0.1,
                 axes_radius=0.005,
             )
-            self.frames.append(frame)
-
-            if cam.model != "PINHOLE":
-                print(f"Expected pinhole camera, but got {cam.model}")
+            self.frames[img_id] = frame
 
-            H, W = cam.height, cam.width
-            fy = cam.params[1]
-            image = iio.imread(image_filename)
-            image = image[::self.downsample_factor, ::self.downsample_factor]
+            image = thumbnails[image_filename]
             frustum = self.server.scene.add_camera_frustum(
                 f"/colmap/frame_{img_id}/frustum",
-                fov=2 * np.arctan2(H / 2, fy),
-                aspect=W / H,
+                fov=self.camera_fov[cam_row],
+                aspect=self.camera_aspect[cam_row],
                 scale=0.15,
                 image=image,
             )
             attach_callback(frustum, frame)
 
     def run(self):
-        """Run the visualization server."""
+        """Run the visualization server, updating the frames when the slider moves."""
         while True:
-            if self.need_update:
-                self.need_update = False
-                self.visualize_frames()
-            time.sleep(1e-3)
+            self.update_event.wait()
+            self.update_event.clear()
+            self.visualize_frames()
 
 
 def visualize_reconstruction(colmap_path: Path, images_path: Path, downsample_factor: int = 2):
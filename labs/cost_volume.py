@@ -0,0 +1,116 @@
+"""
+Matching cost volumes for the scanline stereo solvers in functions.py.
+
+A cost volume holds the cost of every disparity at every pixel with shape
+(max_disp, H, W - max_disp), matching im1[y, x] against im2[y, x + d] as in
+Lab3b.  Volumes are kept in the smallest unsigned dtype that can hold the
+cost, and volume.transpose(1, 0, 2) can be handed straight to
+dynamicProgramVec, which reads it one column at a time without copying.
+"""
+import numpy as np
+
+METHODS = ('ad', 'sad', 'census')
+
+
+def _popcount(values):
+    """Number of set bits of every element of an unsigned integer array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    as_bytes = values.view(np.uint8).reshape(values.shape + (values.itemsize,))
+    return table[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+def _window_sums(image, window):
+    """Sum over a window x window neighbourhood using an integral image.
+
+    Borders are handled by replicating the edge pixels.
+    """
+    radius = window // 2
+    padded = np.pad(image, ((radius, radius), (radius, radius)), mode='edge')
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.uint32)
+    np.cumsum(padded, axis=0, dtype=np.uint32, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    height, width = image.shape
+    return (integral[window:window + height, window:window + width]
+            - integral[:height, window:window + width]
+            - integral[window:window + height, :width]
+            + integral[:height, :width])
+
+
+def census_transform(image, window=5):
+    """Census transform of a grey image.
+
+    Each pixel becomes a bit string with one bit per neighbour in its
+    window x window neighbourhood, set when the neighbour is darker than the
+    centre.  Windows up to 7x7 (48 bits) fit in the returned uint64 array.
+    """
+    image = np.asarray(image)
+    if image.ndim != 2:
+        raise ValueError(f"Census transform expects a grey image, got shape {image.shape}")
+    if window % 2 == 0 or window * window - 1 > 64:
+        raise ValueError(f"Census window must be odd and at most 7, got {window}")
+
+    radius = window // 2
+    height, width = image.shape
+    padded = np.pad(image, radius, mode='edge')
+    census = np.zeros(image.shape, dtype=np.uint64)
+    for dy in range(window):
+        for dx in range(window):
+            if dy == radius and dx == radius:
+                continue
+            census <<= np.uint64(1)
+            census |= padded[dy:dy + height, dx:dx + width] < image
+    return census
+
+
+def cost_volume(im1, im2, max_disp, method='ad', window=5):
+    """Matching cost of every disparity at every pixel of a stereo pair.
+
+    Args:
+        im1, im2: (H, W) or (H, W, C) images, usually uint8.
+        max_disp: Number of disparities, the volume covers W - max_disp columns.
+        method: 'ad' for the absolute difference (summed over channels),
+            'sad' for the absolute difference summed over a window x window
+            neighbourhood, or 'census' for the Hamming distance between
+            census transforms of grey images.
+        window: Window size for 'sad' and 'census'.
+    Returns:
+        volume (np.ndarray): (max_disp, H, W - max_disp) costs in the narrowest
+            unsigned dtype that fits, e.g. uint8 for 'ad' on grey uint8 images
+            and for 'census', uint16 for 'sad' with windows up to 15.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown matching cost {method!r}, expected one of {METHODS}")
+    im1 = np.asarray(im1)
+    im2 = np.asarray(im2)
+    if im1.shape != im2.shape:
+        raise ValueError(f"Stereo images differ in shape: {im1.shape} and {im2.shape}")
+    height, width = im1.shape[:2]
+    out_width = width - max_disp
+
+    if method == 'census':
+        census1 = census_transform(im1, window)[:, :out_width]
+        census2 = census_transform(im2, window)
+        volume = np.empty((max_disp, height, out_width), dtype=np.uint8)
+        for disp in range(max_disp):
+            volume[disp] = _popcount(census1 ^ census2[:, disp:disp + out_width])
+        return volume
+
+    # pick the narrowest dtype that holds the largest possible cost
+    channels = 1 if im1.ndim == 2 else im1.shape[2]
+    if np.issubdtype(im1.dtype, np.floating):
+        dtype = np.float32
+    else:
+        max_value = int(max(im1.max(), im2.max(), 1))
+        dtype = np.min_scalar_type(max_value * channels * (window * window if method == 'sad' else 1))
+    left = im1[:, :out_width].astype(np.int32 if dtype != np.float32 else np.float32)
+    volume = np.empty((max_disp, height, out_width), dtype=dtype)
+    for disp in range(max_disp):
+        diff = np.abs(left - im2[:, disp:disp + out_width])
+        if diff.ndim == 3:
+            diff = diff.sum(axis=2)
+        if method == 'sad':
+            diff = _window_sums(diff, window)
+        volume[disp] = diff
+    return volume
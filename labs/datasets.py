@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from scipy.io import loadmat
+
+from utils import load_image
+
+DATASET_DIR = Path(__file__).resolve().parent.parent / 'dataset'
+
+# Converted assets live next to the originals, one folder per source version
+CACHE_DIR = DATASET_DIR / '.npy_cache'
+
+
+def _source_key(path, *options):
+    """ Cache folder name of a source file, changes when the file or the options change """
+    stat = path.stat()
+    text = f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{options}"
+    return f"{path.stem}-{hashlib.sha1(text.encode()).hexdigest()[:16]}"
+
+
+def _convert(entry, arrays):
+    """ Save arrays as uncompressed .npy files in the cache folder entry
+    The folder is written under a temporary name and renamed into place, so a
+    concurrent or interrupted conversion never leaves a partial entry.
+    """
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=entry.name + '.', dir=entry.parent))
+    try:
+        for name, array in arrays.items():
+            np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(array), allow_pickle=False)
+        (tmp_dir / 'index.json').write_text(json.dumps(sorted(arrays)))
+        os.replace(tmp_dir, entry)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not (entry / 'index.json').exists():
+            raise  # another process finished the same entry first otherwise
+
+
+def _open(entry):
+    names = json.loads((entry / 'index.json').read_text())
+    return {name: np.load(entry / f"{name}.npy", mmap_mode='r') for name in names}
+
+
+def load_mat(name, squeeze_me=False, cache_dir=CACHE_DIR):
+    """ Arrays of a .mat file in dataset/ as read-only memory maps
+    The file is converted once with scipy.io.loadmat into uncompressed .npy
+    files in cache_dir, later calls only map those files. Arrays keep the
+    dtype stored in the file (uint8 for the images), promote them where the
+    maths needs it, e.g. im1.astype(float) or np.asarray(im1, dtype=float).
+    Args:
+        name (str): File name in dataset/, e.g. 'StereoData.mat', or a path
+        squeeze_me (bool): Passed to loadmat, drops unit dimensions
+        cache_dir (Path): Folder of the converted arrays
+    Returns:
+        data (dict): Variable name -> read-only np.memmap, without the
+            __header__, __version__ and __globals__ entries of loadmat
+    """
+    path = Path(name) if os.path.sep in str(name) else DATASET_DIR / name
+    entry = Path(cache_dir) / _source_key(path, squeeze_me)
+    if not (entry / 'index.json').exists():
+        data = loadmat(path, squeeze_me=squeeze_me)
+        arrays = {key: value for key, value in data.items() if not key.startswith('__')}
+        for key, value in arrays.items():
+            if not isinstance(value, np.ndarray) or value.dtype.hasobject:
+                raise TypeError(f"{path.name}:{key} is a MATLAB struct or cell array and cannot be memory-mapped")
+        _convert(entry, arrays)
+    return _open(entry)
+
+
+def load_dataset_image(name, reduce=1, colour=False, cache_dir=CACHE_DIR):
+    """ Image in dataset/ as a read-only memory map, decoded only once
+    Args:
+        name (str): File name in dataset/, e.g. 'Lenna.png', or a path
+        reduce (int): 1, 2, 4 or 8, passed to utils.load_image
+        colour (bool): Load as BGR instead of grey
+        cache_dir (Path): Folder of the decoded images
+    Returns:
+        image (np.memmap): HxW grey or HxWx3 BGR uint8 image
+    """
+    path = Path(name) if os.path.sep in str(name) else DATASET_DIR / name
+    entry = Path(cache_dir) / _source_key(path, reduce, colour)
+    if not (entry / 'index.json').exists():
+        _convert(entry, {'image': load_image(str(path), reduce, colour)})
+    return _open(entry)['image']
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """ Remove every converted asset, they are rebuilt on the next load """
+    shutil.rmtree(cache_dir, ignore_errors=True)
@@ -1,4 +1,12 @@
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
 import numpy as np
+
+from cost_volume import cost_volume
 # the goal of this routine is to return the minimum cost dynamic programming
 # solution given a set of unary and pairwise costs
 def dynamicProgram(unaryCosts, pairwiseCosts):
@@ -20,7 +28,9 @@ def dynamicProgram(unaryCosts, pairwiseCosts):
 
     # FORWARD PASS
 
-    # TODO:  fill in first column of minimum cost matrix
+    # the first column has no incoming paths, so its cost is just the unary cost
+    for cNode in range(nNodesPerPosition):
+        minimumCost[cNode, 0] = unaryCosts[cNode][0]
 
     # Now run through each position (column)
     for cPosition in range(1,nPosition):
@@ -29,67 +39,546 @@ def dynamicProgram(unaryCosts, pairwiseCosts):
             # now we find the costs of all paths from the previous column to this node
             possPathCosts = np.zeros([nNodesPerPosition,1])
             for cPrevNode in range(nNodesPerPosition):
-                # TODO  - fill in elements of possPathCosts
-                possPathCosts[cPrevNode,0] = 0 
+                possPathCosts[cPrevNode,0] = minimumCost[cPrevNode, cPosition-1] + \
+                    pairwiseCosts[cPrevNode][cNode] + unaryCosts[cNode][cPosition]
+
+            # find the minimum of the possible paths
+            ind = np.argmin(possPathCosts[:,0])
+            minCost = possPathCosts[ind,0]
 
-            # TODO - find the minimum of the possible paths 
-            minCost = 0 
-            ind = 0 
-            
             # Assertion to check that there is only one minimum cost.
             # assert(len(np.where(possPathCosts == minCost)[0]) == 1)
 
-            # TODO - store the minimum cost in the minimumCost matrix
-            # minimumCost[, ] = 
-            
-            # TODO - store the parent index in the parents matrix
-            # parents[, ] = 
+            # store the minimum cost and the parent index
+            minimumCost[cNode, cPosition] = minCost
+            parents[cNode, cPosition] = ind
 
     #BACKWARD PASS
 
     #we will now fill in the bestPath vector
     bestPath = np.zeros([nPosition,1])
-    
-    #TODO  - find the index of the overall minimum cost from the last column and put this
-    #into the last entry of best path
-    minCost = 0 
-    minInd = 0 
+
+    # find the index of the overall minimum cost from the last column and put this
+    # into the last entry of best path
+    minInd = np.argmin(minimumCost[:,-1])
     bestPath[-1] = minInd
 
-    # TODO - find the parent of the node you just found
-    bestParent = 0 
+    # find the parent of the node you just found
+    bestParent = parents[minInd, -1]
 
     # run backwards through the cost matrix tracing the best patch
     for cPosition in range(nPosition-2,-1,-1):
-        # TODO - work through matrix backwards, updating bestPath by tracing parents
-        # bestPath = 
-        # bestParent =
-        pass 
+        bestPath[cPosition] = bestParent
+        bestParent = parents[int(bestParent), cPosition]
 
-    # TODO: REMOVE THIS WHEN YOU ARE DONE
-    bestPath = np.floor(np.random.random(nPosition)*nNodesPerPosition)
     return bestPath
 
 
-def dynamicProgramVec(unaryCosts, pairwiseCosts):
-    
-    # same preprocessing code
-    
-    # count number of positions (i.e. pixels in the scanline), and nodes at each
-    # position (i.e. the number of distinct possible disparities at each position)
-    nNodesPerPosition = len(unaryCosts)
-    nPosition = len(unaryCosts[0])
+# smallest number of nodes for which a recognised dense pairwise matrix is
+# solved with the structured O(nNodes) transitions
+STRUCTURED_MIN_NODES = 16
+
+# truncated quadratic models search the jumps cheaper than the truncation
+# when there are at most this many of them, and build the lower envelope of
+# the parabolas otherwise
+QUADRATIC_BAND_JUMPS = 9
+
+# the envelope loops over the nodes in Python, so it only beats the dense
+# broadcast from this many nodes and lines times nodes per step (measured on
+# StereoData with 190 and 20 lines, see bench_stereo_dp.py)
+ENVELOPE_MIN_NODES = 80
+ENVELOPE_MIN_CELLS = 16384
+
+
+def pairwiseMatrix(model, nNodes):
+    """Dense (nNodes, nNodes) pairwise cost matrix for a structured model.
+
+    model is one of ('potts', alpha), ('linear', weight[, truncation]) or
+    ('quadratic', weight[, truncation]); the cost of moving between nodes a
+    and b only depends on |a - b|.
+    """
+    nodes = np.arange(nNodes)
+    return _modelCosts(_asModel(model), np.abs(np.subtract.outer(nodes, nodes)))
+
+
+def pairwiseModel(pairwiseCosts):
+    """Recognise a dense pairwise cost matrix as a structured model.
+
+    Returns the normalised (kind, weight, truncation) tuple if pairwiseCosts
+    is exactly a Potts, truncated linear or truncated quadratic matrix, and
+    None otherwise.
+    """
+    pairwiseCosts = np.asarray(pairwiseCosts, dtype=float)
+    nNodes = len(pairwiseCosts)
+    if pairwiseCosts.shape != (nNodes, nNodes) or nNodes < 2:
+        return None
+
+    # costs as a function of the jump size, read off the first row
+    jumpCosts = pairwiseCosts[0]
+    weight = jumpCosts[1]
+    if weight < 0:
+        return None
+    candidates = [('potts', weight, weight),
+                  ('linear', weight, np.max(jumpCosts)),
+                  ('quadratic', weight, np.max(jumpCosts))]
+    for model in candidates:
+        if np.array_equal(pairwiseMatrix(model, nNodes), pairwiseCosts):
+            return model
+    return None
+
+
+def _asModel(model):
+    # normalise a user supplied model to (kind, weight, truncation)
+    kind, weight = model[0], float(model[1])
+    if kind not in ('potts', 'linear', 'quadratic'):
+        raise ValueError(f"Unknown pairwise model {kind!r}")
+    if kind == 'potts':
+        return (kind, weight, weight)
+    truncation = float(model[2]) if len(model) > 2 and model[2] is not None else np.inf
+    return (kind, weight, truncation)
+
+
+def _modelCosts(model, jump):
+    # pairwise cost of a jump of |jump| nodes under a normalised model
+    kind, weight, truncation = model
+    if kind == 'potts':
+        return weight * (jump != 0)
+    if kind == 'linear':
+        return np.minimum(weight * jump, truncation)
+    return np.minimum(weight * (jump * jump), truncation)
+
+
+def _structuredParents(prevCost, unaryCost, model):
+    """Best parent of every node, and the cost through it, for a structured
+    pairwise model.
+
+    prevCost is the (nLines, nNodes) minimum cost of the previous column and
+    unaryCost the (nLines, nNodes) unary cost of the current one.
+    Instead of scanning all nNodes parents of each node, a handful of
+    candidate parents is found per node in O(nNodes) and the cheapest one is
+    kept, preferring the lower index on ties like np.argmin does.
+    """
+    kind, weight, truncation = model
+    nLines, nNodes = prevCost.shape
+    nodes = np.arange(nNodes)
+
+    # jumping from the overall cheapest node bounds every truncated transition
+    candidates = [np.broadcast_to(np.argmin(prevCost, axis=1)[:, np.newaxis], prevCost.shape)]
+
+    if kind == 'potts':
+        # min of two: stay on the same node or jump from the cheapest one
+        candidates.append(np.broadcast_to(nodes, prevCost.shape))
+    elif kind == 'linear':
+        # distance transform: the lower envelope of the cones
+        # prevCost[a] + weight*|a - b| is a running minimum of
+        # prevCost[a] - weight*a over a <= b, and of prevCost[a] + weight*a
+        # over a >= b
+        left = prevCost - weight * nodes
+        newMin = np.ones(prevCost.shape, dtype=bool)
+        newMin[:, 1:] = left[:, 1:] < np.minimum.accumulate(left, axis=1)[:, :-1]
+        candidates.append(np.maximum.accumulate(np.where(newMin, nodes, 0), axis=1))
+
+        right = (prevCost + weight * nodes)[:, ::-1]
+        newMin[:, 1:] = right[:, 1:] <= np.minimum.accumulate(right, axis=1)[:, :-1]
+        lastMin = np.maximum.accumulate(np.where(newMin, nodes, 0), axis=1)
+        candidates.append((nNodes - 1 - lastMin)[:, ::-1])
+    elif weight > 0:
+        reach = _quadraticReach(model, nNodes)
+        if 2 * reach + 1 <= QUADRATIC_BAND_JUMPS:
+            # tight truncation: only the few jumps cheaper than it are searched
+            bandCost = np.full(prevCost.shape, np.inf)
+            bandParent = np.zeros(prevCost.shape, dtype=np.intp)
+            for jump in range(-reach, reach + 1):
+                lo, hi = max(0, -jump), min(nNodes, nNodes - jump)
+                cost = prevCost[:, lo+jump:hi+jump] + weight * (jump * jump)
+                take = cost < bandCost[:, lo:hi]
+                bandCost[:, lo:hi] = np.where(take, cost, bandCost[:, lo:hi])
+                bandParent[:, lo:hi] = np.where(take, nodes[lo+jump:hi+jump], bandParent[:, lo:hi])
+            candidates.append(bandParent)
+        else:
+            candidates.append(_parabolaEnvelope(prevCost, weight))
+
+    # keep the cheapest candidate, evaluated exactly as the dense path would
+    parents = candidates[0]
+    bestCost = (np.take_along_axis(prevCost, parents, axis=1)
+                + _modelCosts(model, np.abs(parents - nodes)) + unaryCost)
+    for candidate in candidates[1:]:
+        cost = (np.take_along_axis(prevCost, candidate, axis=1)
+                + _modelCosts(model, np.abs(candidate - nodes)) + unaryCost)
+        take = (cost < bestCost) | ((cost == bestCost) & (candidate < parents))
+        parents = np.where(take, candidate, parents)
+        bestCost = np.where(take, cost, bestCost)
+    return parents, bestCost
+
+
+def _denseIsFaster(model, nLines, nNodes):
+    # whether a step of a quadratic model is cheaper with the dense broadcast
+    # than with the band search or the parabola envelope
+    kind, weight, _ = model
+    if kind != 'quadratic' or weight <= 0 or 2 * _quadraticReach(model, nNodes) + 1 <= QUADRATIC_BAND_JUMPS:
+        return False
+    return nNodes < ENVELOPE_MIN_NODES or nLines * nNodes < ENVELOPE_MIN_CELLS
+
+
+@functools.lru_cache(maxsize=8)
+def _denseCosts(model, nNodes):
+    # dense matrix of a normalised model, for steps where it is faster
+    return pairwiseMatrix(model, nNodes)
+
+
+def _quadraticReach(model, nNodes):
+    # largest jump that costs less than the truncation of a quadratic model
+    _, weight, truncation = model
+    if weight > 0 and np.isfinite(truncation):
+        return min(nNodes - 1, int(np.sqrt(truncation / weight)))
+    return nNodes - 1
+
+
+def _parabolaEnvelope(prevCost, weight):
+    """Best parent of every node under an untruncated quadratic model.
+
+    This is the distance transform of Felzenszwalb and Huttenlocher: the
+    lower envelope of the parabolas prevCost[a] + weight*(a - b)^2 is built
+    left to right on a stack, each parabola being pushed and popped at most
+    once, and then read off at every node, so the work is O(nNodes) per line.
+    All lines are processed together, one parabola at a time.  On a tie the
+    envelope keeps the parabola of the lower node, like np.argmin.
+    """
+    nLines, nNodes = prevCost.shape
+    lines = np.arange(nLines)
+    nodes = np.arange(nNodes)
+    height = prevCost + weight * (nodes * nodes)
+
+    # vertex[l, k] is the node of the k-th parabola on the envelope of line l,
+    # which is lowest from boundary[l, k] to boundary[l, k+1]
+    vertex = np.zeros((nLines, nNodes), dtype=np.intp)
+    boundary = np.empty((nLines, nNodes + 1))
+    boundary[:, 0] = -np.inf
+    boundary[:, 1] = np.inf
+    top = np.zeros(nLines, dtype=np.intp)
+    for node in range(1, nNodes):
+        while True:
+            # where the new parabola crosses the one on top of the stack
+            prevNode = vertex[lines, top]
+            crossing = (height[:, node] - height[lines, prevNode]) / (2 * weight * (node - prevNode))
+            hidden = crossing <= boundary[lines, top]
+            if not hidden.any():
+                break
+            top -= hidden
+        top += 1
+        vertex[lines, top] = node
+        boundary[lines, top] = crossing
+        boundary[lines, top + 1] = np.inf
+
+    # the parabola of node b is the number of boundaries left of b, found
+    # for all lines with one searchsorted by giving each line its own range
+    bounds = np.clip(boundary[:, 1:], -1, nNodes)
+    bounds[nodes >= top[:, np.newaxis]] = nNodes
+    offset = (lines * (nNodes + 2))[:, np.newaxis]
+    index = np.searchsorted((bounds + offset).ravel(), (nodes + offset).ravel(), side='left')
+    index = index.reshape(nLines, nNodes) - (lines * nNodes)[:, np.newaxis]
+    return np.take_along_axis(vertex, index, axis=1)
+
+
+def _resolvePairwise(pairwiseCosts, structured):
+    # dense matrix and structured model (or None) for the given pairwise costs
+    if isinstance(pairwiseCosts, tuple):
+        return None, _asModel(pairwiseCosts)
+    pairwiseCosts = np.asarray(pairwiseCosts, dtype=float)
+    # for a few nodes the dense broadcast is cheaper than the fast path
+    model = None
+    if structured and len(pairwiseCosts) >= STRUCTURED_MIN_NODES:
+        model = pairwiseModel(pairwiseCosts)
+    return pairwiseCosts, model
+
+
+def _transition(prevCost, unaryCost, pairwiseCosts, model):
+    """One min-plus step for a batch of lines.
+
+    prevCost is the (nLines, nNodes) minimum cost of the previous position and
+    unaryCost the (nLines, nNodes) unary cost of the current one.  Returns the
+    best parent of every node and the minimum cost through it.
+    """
+    if model is not None:
+        if not _denseIsFaster(model, *prevCost.shape):
+            return _structuredParents(prevCost, unaryCost, model)
+        if pairwiseCosts is None:
+            pairwiseCosts = _denseCosts(model, prevCost.shape[1])
+
+    # possPathCosts[l, prev, node] = cost of reaching node through prev.
+    # The terms are summed in the same order as dynamicProgram so that
+    # ties are broken identically.
+    possPathCosts = prevCost[:, :, np.newaxis] + pairwiseCosts
+    possPathCosts += unaryCost[:, np.newaxis, :]
+    ind = np.argmin(possPathCosts, axis=1)
+    return ind, np.take_along_axis(possPathCosts, ind[:, np.newaxis, :], axis=1)[:, 0, :]
+
+
+def dynamicProgramVec(unaryCosts, pairwiseCosts, structured=True):
+    """Vectorised version of dynamicProgram.
+
+    The forward pass handles every node of a column at once with broadcasting:
+    the (prev node, node) table of path costs is formed in one step and reduced
+    with argmin, so the only Python loop left is over positions.
+
+    unaryCosts can either be a single scanline of shape (nNodes, nPosition),
+    in which case a path of shape (nPosition,) is returned, or a stack of
+    scanlines of shape (nLines, nNodes, nPosition).  In the stacked case every
+    scanline is solved in the same call and the result is the whole
+    (nLines, nPosition) disparity map.
+
+    pairwiseCosts is either a dense (nNodes, nNodes) matrix or a structured
+    model such as ('potts', alpha), ('linear', weight, truncation) or
+    ('quadratic', weight, truncation) (see pairwiseMatrix).  Structured models,
+    and dense matrices of at least STRUCTURED_MIN_NODES nodes recognised as one
+    when structured is True, are solved in O(nNodes) per pixel instead of
+    O(nNodes^2), except for loosely truncated quadratic models on too few
+    nodes or lines for the parabola envelope to pay off (ENVELOPE_MIN_NODES,
+    ENVELOPE_MIN_CELLS), which use the dense broadcast.  They give the same result as the dense path, except that
+    where several paths have exactly the same total cost rounding may pick a
+    different one of them.
+
+    unaryCosts may have any numeric dtype and need not be contiguous, so a
+    compact cost volume from cost_volume.py can be passed as
+    volume.transpose(1, 0, 2); only one column is read at a time and the
+    volume is never copied or converted as a whole.
+    """
+    unaryCosts = np.asarray(unaryCosts)
+    pairwiseCosts, model = _resolvePairwise(pairwiseCosts, structured)
+
+    singleLine = unaryCosts.ndim == 2
+    if singleLine:
+        unaryCosts = unaryCosts[np.newaxis]
+
+    # count number of scanlines, nodes at each position and positions
+    nLines, nNodesPerPosition, nPosition = unaryCosts.shape
 
     # define minimum cost matrix - each element will eventually contain
     # the minimum cost to reach this node from the left hand side.
     # We will update it as we move from left to right
-    minimumCost = np.zeros([nNodesPerPosition, nPosition])
+    minimumCost = np.empty([nLines, nNodesPerPosition, nPosition])
+    parents = np.zeros([nLines, nNodesPerPosition, nPosition], dtype=np.intp)
+
+    # FORWARD PASS
+    minimumCost[:, :, 0] = unaryCosts[:, :, 0]
+    for cPosition in range(1, nPosition):
+        ind, minCost = _transition(minimumCost[:, :, cPosition-1], unaryCosts[:, :, cPosition],
+                                   pairwiseCosts, model)
+        parents[:, :, cPosition] = ind
+        minimumCost[:, :, cPosition] = minCost
+
+    # BACKWARD PASS - trace every scanline at once
+    lines = np.arange(nLines)
+    bestPath = np.zeros([nLines, nPosition], dtype=np.intp)
+    bestPath[:, -1] = np.argmin(minimumCost[:, :, -1], axis=1)
+    for cPosition in range(nPosition-1, 0, -1):
+        bestPath[:, cPosition-1] = parents[lines, bestPath[:, cPosition], cPosition]
+
+    if singleLine:
+        return bestPath[0]
+    return bestPath
+
+
+# (row step, column step) of the paths aggregated by semiGlobalMatching
+SGM_DIRECTIONS = {
+    4: [(0, 1), (0, -1), (1, 0), (-1, 0)],
+    8: [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)],
+}
+
+
+def _pathStep(prevCost, unaryCost, pairwiseCosts, model):
+    # the DP step minus the smallest previous cost, which keeps path costs
+    # bounded however long the path is
+    _, minCost = _transition(prevCost, unaryCost, pairwiseCosts, model)
+    return minCost - prevCost.min(axis=1, keepdims=True)
+
+
+def _aggregateDirection(costVolume, pairwiseCosts, model, dy, dx, total, lock):
+    """Add the path costs of one direction to total.
+
+    Only the path costs of the current line are kept, so a sweep needs
+    O(nNodes * max(H, W)) memory on top of the shared total.
+    """
+    nNodes, nRows, nCols = costVolume.shape
+
+    if dy == 0:
+        # horizontal paths - every row is a line, step along the columns
+        pathCost = None
+        for cCol in (range(nCols) if dx > 0 else range(nCols-1, -1, -1)):
+            unaryCost = costVolume[:, :, cCol].T
+            if pathCost is None:
+                pathCost = unaryCost.astype(float)
+            else:
+                pathCost = _pathStep(pathCost, unaryCost, pairwiseCosts, model)
+            with lock:
+                total[:, :, cCol] += pathCost.T
+        return
+
+    # vertical and diagonal paths - every column is a line, step along the
+    # rows and shift by dx; paths entering from the image edge start afresh
+    pathCost = None
+    for cRow in (range(nRows) if dy > 0 else range(nRows-1, -1, -1)):
+        unaryCost = costVolume[:, cRow, :].T
+        newCost = unaryCost.astype(float)
+        if pathCost is not None:
+            if dx == 0:
+                newCost = _pathStep(pathCost, unaryCost, pairwiseCosts, model)
+            elif dx > 0:
+                newCost[1:] = _pathStep(pathCost[:-1], unaryCost[1:], pairwiseCosts, model)
+            else:
+                newCost[:-1] = _pathStep(pathCost[1:], unaryCost[:-1], pairwiseCosts, model)
+        pathCost = newCost
+        with lock:
+            total[:, cRow, :] += pathCost.T
+
+
+def semiGlobalMatching(costVolume, pairwiseCosts, directions=8, workers=None, structured=True):
+    """Semi-global matching over a (nNodes, H, W) cost volume.
+
+    Instead of solving each scanline on its own, the min-plus recurrence of
+    dynamicProgramVec is run along 4 or 8 directions through every pixel and
+    the path costs are summed before picking the cheapest disparity.  The
+    directions are swept in parallel threads, each streaming one line at a
+    time into a single float32 total, so memory stays at one extra volume.
+
+    Args:
+        costVolume: (nNodes, H, W) unary costs, e.g. from cost_volume.py.
+        pairwiseCosts: Dense matrix or structured model, as for dynamicProgramVec.
+        directions: 4 or 8 path directions.
+        workers: Number of threads, one per direction by default.
+        structured: Recognise structured dense matrices, as for dynamicProgramVec.
+    Returns:
+        disparity (np.ndarray): (H, W) index of the cheapest node at each pixel.
+    """
+    if directions not in SGM_DIRECTIONS:
+        raise ValueError(f"Semi-global matching supports 4 or 8 directions, got {directions}")
+    costVolume = np.asarray(costVolume)
+    pairwiseCosts, model = _resolvePairwise(pairwiseCosts, structured)
+
+    total = np.zeros(costVolume.shape, dtype=np.float32)
+    lock = threading.Lock()
+    sweeps = SGM_DIRECTIONS[directions]
+    with ThreadPoolExecutor(max_workers=workers or len(sweeps)) as pool:
+        tasks = [pool.submit(_aggregateDirection, costVolume, pairwiseCosts, model, dy, dx, total, lock)
+                 for dy, dx in sweeps]
+        for task in tasks:
+            task.result()
+    return np.argmin(total, axis=0)
+
+
+def stereoUnaryCosts(im1, im2, maxDisp, noiseSD):
+    """Unary costs for every scanline of a rectified stereo pair.
+
+    The cost of disparity d at pixel (y, x) is the negative log likelihood of
+    im1[y, x] under a Gaussian with mean im2[y, x + d] and standard deviation
+    noiseSD (dropping the constant term).  The last maxDisp columns are not
+    used, so the result has shape (nLines, maxDisp, nColumns - maxDisp).
+    """
+    im1 = np.asarray(im1, dtype=float)
+    im2 = np.asarray(im2, dtype=float)
+    width = im1.shape[1] - maxDisp
+    unaryCosts = np.empty([im1.shape[0], maxDisp, width])
+    for cDisp in range(maxDisp):
+        unaryCosts[:, cDisp, :] = (im1[:, :width] - im2[:, cDisp:cDisp+width]) ** 2
+    unaryCosts /= 2 * noiseSD ** 2
+    return unaryCosts
+
+
+# shared memory blocks attached by each worker of compute_disparity_map
+_sharedArrays = {}
+
+
+def _attachSharedArrays(specs):
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _sharedArrays[key] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+
+def _bandUnaryCosts(im1, im2, start, stop, maxDisp, noiseSD, cost, window):
+    # (nLines, maxDisp, nColumns) unary costs of rows start:stop
+    if cost == 'gaussian':
+        return stereoUnaryCosts(im1[start:stop], im2[start:stop], maxDisp, noiseSD)
+
+    # windowed costs need the rows around the band as well
+    halo = window // 2 if cost in ('sad', 'census') else 0
+    lo, hi = max(0, start - halo), min(len(im1), stop + halo)
+    volume = cost_volume(im1[lo:hi], im2[lo:hi], maxDisp, cost, window)
+    return volume[:, start-lo:stop-lo].transpose(1, 0, 2)
+
+
+def _solveBand(start, stop, maxDisp, pairwiseCosts, noiseSD, cost, window):
+    im1 = _sharedArrays['im1'][1]
+    im2 = _sharedArrays['im2'][1]
+    disparity = _sharedArrays['disparity'][1]
+    unaryCosts = _bandUnaryCosts(im1, im2, start, stop, maxDisp, noiseSD, cost, window)
+    disparity[start:stop] = dynamicProgramVec(unaryCosts, pairwiseCosts)
+    return start, stop
+
+
+def compute_disparity_map(im1, im2, max_disp, pairwise, workers=None, noise_sd=6, band_rows=None,
+                          cost='gaussian', window=5, directions=None):
+    """Scanline DP disparity map of a rectified stereo pair.
+
+    Every scanline is independent, so the rows are split into bands that are
+    solved with dynamicProgramVec on a pool of worker processes.  The images
+    and the output live in shared memory, so each task only sends the row
+    range of its band.
+
+    Args:
+        im1, im2: (H, W) grey images; im1 is matched against im2 shifted right.
+        max_disp: Number of disparities considered.
+        pairwise: Pairwise costs, a dense matrix or a structured model.
+        workers: Number of worker processes, all cores by default.  With a
+            single worker the map is computed in this process.
+        noise_sd: Standard deviation of the Gaussian unary cost.
+        band_rows: Rows per task, by default about four bands per worker.
+        cost: 'gaussian' for the Lab3b negative log likelihood, or one of the
+            cost_volume methods ('ad', 'sad', 'census').
+        window: Window size of the 'sad' and 'census' costs.
+        directions: None to solve independent scanlines, or 4 or 8 to use
+            semiGlobalMatching, in which case workers is the number of
+            threads sweeping the directions.
+    Returns:
+        disparity (np.ndarray): (H, W - max_disp) integer disparity map.
+    """
+    im1 = np.asarray(im1)
+    im2 = np.asarray(im2)
+    nLines = im1.shape[0]
+    workers = workers or os.cpu_count() or 1
+    if band_rows is None:
+        band_rows = max(1, -(-nLines // (4 * workers)))
 
+    if directions is not None:
+        unaryCosts = _bandUnaryCosts(im1, im2, 0, nLines, max_disp, noise_sd, cost, window)
+        return semiGlobalMatching(unaryCosts.transpose(1, 0, 2), pairwise, directions, workers)
 
+    if workers == 1:
+        return dynamicProgramVec(_bandUnaryCosts(im1, im2, 0, nLines, max_disp, noise_sd, cost, window),
+                                 pairwise)
 
-    # TODO: fill this function in. (hint use tiling and perform calculations columnwise with matricies)
+    outShape = (nLines, im1.shape[1] - max_disp)
+    layout = {'im1': (im1.shape, im1.dtype), 'im2': (im2.shape, im2.dtype),
+              'disparity': (outShape, np.dtype(np.intp))}
+    blocks = {}
+    try:
+        specs = {}
+        for key, (shape, dtype) in layout.items():
+            block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            blocks[key] = block
+            specs[key] = (block.name, shape, dtype)
+        np.ndarray(im1.shape, dtype=im1.dtype, buffer=blocks['im1'].buf)[...] = im1
+        np.ndarray(im2.shape, dtype=im2.dtype, buffer=blocks['im2'].buf)[...] = im2
 
-    # TODO: REMOVE THIS WHEN YOU ARE DONE
-    bestPath = np.floor(np.random.random(nPosition)*nNodesPerPosition)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attachSharedArrays,
+                                 initargs=(specs,)) as pool:
+            tasks = [pool.submit(_solveBand, start, min(start + band_rows, nLines),
+                                 max_disp, pairwise, noise_sd, cost, window)
+                     for start in range(0, nLines, band_rows)]
+            for task in tasks:
+                task.result()
 
-    return bestPath
\ No newline at end of file
+        return np.ndarray(outShape, dtype=np.intp, buffer=blocks['disparity'].buf).copy()
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
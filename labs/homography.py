@@ -0,0 +1,223 @@
+import functools
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Output size of the rectified number plates in Lab3
+PLATE_SIZE = (280, 80)
+
+WARP_CACHE_SIZE = 8
+
+
+def normalise_points(points):
+    """ Hartley normalisation of a batch of point sets
+    Args:
+        points (np.ndarray): (B, N, 2) Cartesian points
+    Returns:
+        (normalised, T): (B, N, 2) points with zero mean and mean distance
+            sqrt(2) to the origin, and the (B, 3, 3) similarity transforms
+            with normalised = T @ points
+    """
+    points = np.asarray(points, dtype=np.float64)
+    centroid = points.mean(axis=1, keepdims=True)
+    mean_distance = np.linalg.norm(points - centroid, axis=2).mean(axis=1)
+    scale = np.sqrt(2) / np.maximum(mean_distance, np.finfo(np.float64).eps)
+
+    T = np.zeros((len(points), 3, 3))
+    T[:, 0, 0] = T[:, 1, 1] = scale
+    T[:, :2, 2] = -scale[:, np.newaxis] * centroid[:, 0]
+    T[:, 2, 2] = 1
+    return (points - centroid) * scale[:, np.newaxis, np.newaxis], T
+
+
+def dlt_matrices(src, dst):
+    """ Stack the DLT rows A_i of every point pair, as in Lab3 Task 1.3
+    Args:
+        src (np.ndarray): (B, N, 2) points x'
+        dst (np.ndarray): (B, N, 2) points x, with x ~ H x'
+    Returns:
+        A (np.ndarray): (B, 2N, 9) matrices with A h = 0
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    batch, n_points = src.shape[:2]
+    xs, ys = src[..., 0], src[..., 1]
+    x, y = dst[..., 0], dst[..., 1]
+    zeros, ones = np.zeros_like(xs), np.ones_like(xs)
+
+    A = np.empty((batch, n_points, 2, 9))
+    A[:, :, 0] = np.stack([-xs, -ys, -ones, zeros, zeros, zeros, x * xs, x * ys, x], axis=-1)
+    A[:, :, 1] = np.stack([zeros, zeros, zeros, -xs, -ys, -ones, y * xs, y * ys, y], axis=-1)
+    return A.reshape(batch, 2 * n_points, 9)
+
+
+def find_homographies(src, dst):
+    """ Normalised DLT for a batch of point sets with one stacked SVD
+    Args:
+        src (np.ndarray): (B, N, 2) or (N, 2) source points, N >= 4
+        dst (np.ndarray): Matching destination points of the same shape
+    Returns:
+        H (np.ndarray): (B, 3, 3) or (3, 3) homographies mapping src to dst,
+            scaled so that H[2, 2] = 1 where possible
+    """
+    src = np.asarray(src, dtype=np.float64)
+    single = src.ndim == 2
+    src = src.reshape(-1, src.shape[-2], 2)
+    dst = np.asarray(dst, dtype=np.float64).reshape(src.shape)
+    if src.shape[1] < 4:
+        raise ValueError(f"A homography needs at least 4 point pairs, got {src.shape[1]}")
+
+    src_n, T_src = normalise_points(src)
+    dst_n, T_dst = normalise_points(dst)
+    A = dlt_matrices(src_n, dst_n)
+    # the null vector is the last right singular vector, full matrices are
+    # only needed when A has fewer rows than columns (4 point pairs)
+    _, _, Vt = np.linalg.svd(A, full_matrices=A.shape[1] < 9)
+    H = Vt[:, -1].reshape(-1, 3, 3)
+
+    H = np.linalg.inv(T_dst) @ H @ T_src
+    scale = H[:, 2:, 2:]
+    H /= np.where(np.abs(scale) > 1e-12, scale, 1.0)
+    return H[0] if single else H
+
+
+def corners_of(size):
+    """ Corners of a (width, height) image, clockwise from the top left """
+    width, height = size
+    return np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float64)
+
+
+@functools.lru_cache(maxsize=WARP_CACHE_SIZE)
+def _target_grid(size):
+    """ Read-only (3, H*W) homogeneous coordinates of every target pixel """
+    width, height = size
+    ys, xs = np.mgrid[0:height, 0:width]
+    grid = np.stack([xs.ravel(), ys.ravel(), np.ones(width * height)]).astype(np.float64)
+    grid.flags.writeable = False
+    return grid
+
+
+def warp_maps(H, size):
+    """ Remap tables of the inverse warp for a batch of homographies
+    Args:
+        H (np.ndarray): (B, 3, 3) or (3, 3) homographies from source images
+            to the target
+        size (tuple): (width, height) of the target, the pixel grid of each
+            size is built once and cached
+    Returns:
+        (map_x, map_y): float32 (B, height, width) or (height, width) source
+            coordinates of every target pixel, for cv2.remap
+    """
+    H = np.asarray(H, dtype=np.float64)
+    single = H.ndim == 2
+    width, height = size
+    source = np.linalg.inv(H.reshape(-1, 3, 3)) @ _target_grid(tuple(size))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        map_x = (source[:, 0] / source[:, 2]).astype(np.float32).reshape(-1, height, width)
+        map_y = (source[:, 1] / source[:, 2]).astype(np.float32).reshape(-1, height, width)
+    if single:
+        return map_x[0], map_y[0]
+    return map_x, map_y
+
+
+def warp_images(images, H, size=PLATE_SIZE, workers=None):
+    """ Warp every image by its homography to size on a thread pool
+    cv2.warpPerspective is as fast as cv2.remap with precomputed tables
+    (benchmarks/bench_homography.py), so tables from warp_maps only pay off
+    when a fixed homography is applied with cv2.remap over and over.
+    """
+    H = np.asarray(H, dtype=np.float64).reshape(-1, 3, 3)
+    if len(images) < 2 or workers == 1:
+        return [cv2.warpPerspective(image, h, size) for image, h in zip(images, H)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return list(pool.map(lambda args: cv2.warpPerspective(*args, size), zip(images, H)))
+
+
+def order_corners(points):
+    """ Order four points clockwise from the top left """
+    points = np.asarray(points, dtype=np.float64).reshape(4, 2)
+    total = points.sum(axis=1)
+    difference = points[:, 1] - points[:, 0]
+    return points[[np.argmin(total), np.argmin(difference), np.argmax(total), np.argmax(difference)]]
+
+
+def detect_quad(image, min_area=0.02):
+    """ Corners of the largest bright quadrilateral, such as a number plate
+    Args:
+        image (np.ndarray): Grey or BGR image
+        min_area (float): Smallest accepted area as a fraction of the image
+    Returns:
+        corners (np.ndarray): (4, 2) corners clockwise from the top left, or
+            None if no quadrilateral was found
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    _, mask = cv2.threshold(cv2.GaussianBlur(gray, (5, 5), 0), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    height, width = gray.shape
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+        if cv2.contourArea(contour) < min_area * gray.size:
+            break
+        x, y, w, h = cv2.boundingRect(contour)
+        if x == 0 or y == 0 or x + w == width or y + h == height:
+            continue  # touches the border, background rather than an object
+        # the hull closes the gaps left by dark characters on the plate
+        hull = cv2.convexHull(contour)
+        quad = cv2.approxPolyDP(hull, 0.03 * cv2.arcLength(hull, True), True)
+        if len(quad) == 4:
+            return order_corners(quad)
+    return None
+
+
+def rectify_directory(
+    pattern: str,
+    detect: Callable[[np.ndarray], Optional[np.ndarray]] = detect_quad,
+    size: Tuple[int, int] = PLATE_SIZE,
+    target_points: Optional[np.ndarray] = None,
+    workers: Optional[int] = None,
+    batch_size: int = 64,
+    flags: int = cv2.IMREAD_GRAYSCALE,
+) -> Iterator[Tuple[str, Optional[np.ndarray], Optional[np.ndarray]]]:
+    """ Stream images through detection, homography and warp
+    Images are loaded and detected on a thread pool, the homographies of each
+    batch are solved with one find_homographies call and the images are
+    warped on the pool again. At most batch_size images are held in memory at a time.
+    Args:
+        pattern (str): Glob of the images, e.g. 'plates/*.jpg'
+        detect (Callable): Maps an image to its (N, 2) points, or None
+        size (tuple): (width, height) of the rectified images
+        target_points (np.ndarray): (N, 2) points the detections map to, the
+            corners of the target by default
+        workers (int): Number of threads, from the CPU count by default
+        batch_size (int): Images per batch
+        flags (int): cv2.imread flags
+    Returns:
+        Iterator of (path, H, rectified), with H and rectified None for
+        images without a detection, in the order of the sorted paths
+    """
+    paths = sorted(glob.glob(pattern))
+    target = corners_of(size) if target_points is None else np.asarray(target_points, dtype=np.float64)
+
+    def load_and_detect(path):
+        image = cv2.imread(path, flags)
+        return image, (detect(image) if image is not None else None)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            loaded = list(pool.map(load_and_detect, batch))
+            found = [i for i, (_, points) in enumerate(loaded) if points is not None]
+
+            rectified = {}
+            if found:
+                H = find_homographies(np.stack([loaded[i][1] for i in found]),
+                                      np.broadcast_to(target, (len(found),) + target.shape))
+                warped = pool.map(lambda args: cv2.warpPerspective(*args, size),
+                                  zip([loaded[i][0] for i in found], H))
+                rectified = {i: (H[k], image) for k, (i, image) in enumerate(zip(found, warped))}
+
+            for i, path in enumerate(batch):
+                yield (path,) + rectified.get(i, (None, None))
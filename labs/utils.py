@@ -1,10 +1,14 @@
+import functools
+import glob
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import copy
 import cv2
 import matplotlib.image as mpimg
 from matplotlib import pyplot as plt
 import random
-from PIL import Image
 from typing import Union
 from sklearn.feature_extraction.image import check_array, _extract_patches, \
 _compute_n_patches, check_random_state
@@ -12,51 +16,65 @@ _compute_n_patches, check_random_state
 
 def resize(img, scale: Union[float, int]) -> np.ndarray:
     """ Resize an image maintaining its proportions
+    Enlarging uses INTER_LINEAR. Shrinking uses INTER_AREA, which averages
+    the source pixels instead of aliasing, after a pyramid of exact 2x2
+    halvings while the image is at least twice the target size; the
+    halvings take OpenCV's fast integer-factor path.
     Args:
-        fp (str): Path argument to image file
+        img (np.ndarray): Grey (HxW) or colour (HxWxC) image
         scale (Union[float, int]): Percent as whole number of original image. eg. 53
     Returns:
         image (np.ndarray): Scaled image
     """
-    _scale = lambda dim, s: int(dim * s / 100)
-    height, width, channels = img.shape
+    _scale = lambda dim, s: max(int(dim * s / 100), 1)
+    height, width = img.shape[:2]
     new_width: int = _scale(width, scale)
     new_height: int = _scale(height, scale)
     new_dim: tuple = (new_width, new_height)
-    return cv2.resize(src=img, dsize=new_dim, interpolation=cv2.INTER_LINEAR)
+    if new_width >= width and new_height >= height:
+        return cv2.resize(src=img, dsize=new_dim, interpolation=cv2.INTER_LINEAR)
+    while img.shape[1] >= 2 * new_width and img.shape[0] >= 2 * new_height:
+        img = cv2.resize(src=img, dsize=(img.shape[1] // 2, img.shape[0] // 2), interpolation=cv2.INTER_AREA)
+    return cv2.resize(src=img, dsize=new_dim, interpolation=cv2.INTER_AREA)
 
-def colourize(img):
-    height, width = img.shape
-
-    colors = []
-    colors.append([])
-    colors.append([])
-    color = 1
-    # Displaying distinct components with distinct colors
-    coloured_img = Image.new("RGB", (width, height))
-    coloured_data = coloured_img.load()
-
-    for i in range(len(img)):
-        for j in range(len(img[0])):
-            if img[i][j] > 0:
-                if img[i][j] not in colors[0]:
-                    colors[0].append(img[i][j])
-                    colors[1].append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+def colourize(img, out=None):
+    """ Give every positive label of a label image its own random colour
+    Args:
+        img (np.ndarray): HxW label image, labels <= 0 are background
+        out (np.ndarray): Optional HxWx3 uint8 buffer to write into
+    Returns:
+        coloured_img (np.ndarray): HxWx3 uint8 RGB image with a black
+            background. Colours are drawn from `random` in order of first
+            appearance in raster order.
+    """
+    img = np.asarray(img)
+    if out is None:
+        out = np.empty(img.shape + (3,), dtype=np.uint8)
 
-                ind = colors[0].index(img[i][j])
-                coloured_data[j, i] = colors[1][ind]
+    labels, first_index, inverse = np.unique(img, return_index=True, return_inverse=True)
+    palette = np.zeros((len(labels), 3), dtype=np.uint8)
+    for label_index in np.argsort(first_index):
+        if labels[label_index] > 0:
+            palette[label_index] = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
 
-    return coloured_img
+    np.take(palette, inverse.reshape(img.shape), axis=0, out=out)
+    return out
 
 
-def binarize(img_array, threshold=130):
-    for i in range(len(img_array)):
-        for j in range(len(img_array[0])):
-            if img_array[i][j] > threshold:
-                img_array[i][j] = 0
-            else:
-                img_array[i][j] = 1
-    return img_array
+def binarize(img_array, threshold=130, out=None):
+    """ Map pixels above threshold to 0 and the rest to 1
+    Args:
+        img_array (np.ndarray): Grey image
+        threshold (int): Largest value mapped to 1
+        out (np.ndarray): Array to write into, img_array itself by default
+    Returns:
+        out (np.ndarray): The binarized image
+    """
+    img_array = np.asarray(img_array)
+    if out is None:
+        out = img_array
+    out[...] = img_array <= threshold
+    return out
 
 
 def draw_corners(image, corners_map):
@@ -67,49 +85,233 @@ def draw_corners(image, corners_map):
         cv2.circle(color_img, (each_corner[1], each_corner[0]), 1, (255,0,0), -1)
     return color_img
 
-def load_image(path_name):
-    image = cv2.imread(path_name)
-    grayscale_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    return grayscale_image
+# cv2.imread flags decoding straight to grey or colour at 1/1, 1/2, 1/4 or 1/8 size
+_IMREAD_FLAGS = {
+    (False, 1): cv2.IMREAD_GRAYSCALE, (True, 1): cv2.IMREAD_COLOR,
+    (False, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2, (True, 2): cv2.IMREAD_REDUCED_COLOR_2,
+    (False, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4, (True, 4): cv2.IMREAD_REDUCED_COLOR_4,
+    (False, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8, (True, 8): cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def load_image(path_name, reduce=1, colour=False):
+    """ Load an image, decoding it straight to grey and optionally at reduced size
+    JPEGs are decoded to grey from their luma channel without a colour pass,
+    which differs slightly from decoding to BGR and using cvtColor, and
+    reduced sizes come from the DCT so the full resolution image is never
+    built.
+    Args:
+        path_name (str): Path of the image file
+        reduce (int): 1, 2, 4 or 8, the size is divided by this factor
+        colour (bool): Load as BGR instead of grey
+    Returns:
+        image (np.ndarray): HxW grey or HxWx3 BGR image
+    """
+    if (colour, reduce) not in _IMREAD_FLAGS:
+        raise ValueError(f"reduce must be 1, 2, 4 or 8, got {reduce}")
+    image = cv2.imread(path_name, _IMREAD_FLAGS[colour, reduce])
+    if image is None:
+        raise FileNotFoundError(f"Could not read an image from {path_name}")
+    return image
+
+
+def stream_images(pattern, scale=100, reduce=1, colour=False, workers=None, max_pending=None):
+    """ Load and resize a folder of images on a thread pool, in sorted order
+    Only max_pending images are decoded ahead of the consumer, so memory
+    stays bounded however many images match.
+    Args:
+        pattern (str): Folder or glob of the images, e.g. '../dataset/*.jpg'
+        scale (Union[float, int]): Percent passed to resize after loading,
+            relative to the decoded (possibly reduced) image
+        reduce (int): Reduced decoding factor passed to load_image
+        colour (bool): Load as BGR instead of grey
+        workers (int): Number of threads, from the CPU count by default
+        max_pending (int): Images in flight, twice the workers by default
+    Returns:
+        Iterator of (path, image)
+    """
+    if os.path.isdir(pattern):
+        paths = sorted(path for path in glob.glob(os.path.join(pattern, '*')) if cv2.haveImageReader(path))
+    else:
+        paths = sorted(glob.glob(pattern))
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+
+    def load(path):
+        image = load_image(path, reduce, colour)
+        return image if scale == 100 else resize(image, scale)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append((path, pool.submit(load, path)))
+            if len(pending) >= max_pending:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+# apply_kernel switches to an FFT from these kernel sizes, for general and
+# for separable kernels (see benchmarks/bench_apply_kernel.py)
+FFT_MIN_KERNEL_SIZE = 5
+FFT_MIN_SEPARABLE_SIZE = 11
+
+
+def separable_factors(kernel, rtol=1e-10):
+    """ Split a rank-1 kernel into the outer product of two 1-D kernels
+    Args:
+        kernel (np.ndarray): 2-D kernel
+        rtol (float): Largest relative second singular value to treat as rank 1
+    Returns:
+        factors (tuple): (column, row) with kernel == np.outer(column, row),
+            or None if the kernel is not separable
+    """
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0 or (len(s) > 1 and s[1] > rtol * s[0]):
+        return None
+    scale = np.sqrt(s[0])
+    return u[:, 0] * scale, vt[0] * scale
+
+
+def _pad(image, kernel_size):
+    # (kernel_size - 1) // 2 zeros before and the rest after, so that there is
+    # one window per pixel for even kernel sizes too
+    before = (kernel_size - 1) // 2
+    after = kernel_size - 1 - before
+    return np.pad(image.astype(np.float64, copy=False), ((before, after), (before, after), (0, 0)))
 
-def apply_kernel(image, kernel):
+
+def _apply_kernel_loop(image, kernel):
+    # reference implementation, one window at a time
     kernel_size = kernel.shape[0]
+    padded_image = _pad(image, kernel_size)
+    filtered_image = np.zeros(image.shape)
+    for i in range(image.shape[0]):
+        for j in range(image.shape[1]):
+            current_block = padded_image[i:i+kernel_size, j:j+kernel_size]
+            filtered_image[i, j] = np.sum(current_block * kernel[:, :, np.newaxis], axis=(0, 1))
+    return filtered_image
 
-    padding_amount = int((kernel_size - 1) / 2)
-    rows = image.shape[0] + 2 * padding_amount
-    cols = image.shape[1] + 2 * padding_amount
-    channels = image.shape[2]
-    padded_image_placeholder = np.zeros((rows, cols, channels))
-    padded_image_placeholder[padding_amount:rows-padding_amount, padding_amount:cols-padding_amount, :] = image
 
+def _apply_kernel_strided(image, kernel):
+    # every window as a strided view; each kernel tap then weights one
+    # HxWxC slice of it, so the work is a multiply-add per tap over the image
+    kernel_size = kernel.shape[0]
+    padded_image = _pad(image, kernel_size)
+    windows = np.lib.stride_tricks.sliding_window_view(padded_image, (kernel_size, kernel_size), axis=(0, 1))
     filtered_image = np.zeros(image.shape)
+    for i in range(kernel_size):
+        for j in range(kernel_size):
+            if kernel[i, j] != 0:
+                filtered_image += kernel[i, j] * windows[:, :, :, i, j]
+    return filtered_image
 
-    for each_channel in range(channels):
-        padded_2d_image = padded_image_placeholder[:,:,each_channel]
-        filtered_2d_image = filtered_image[:,:,each_channel]
-        width = padded_2d_image.shape[0]
-        height = padded_2d_image.shape[1]
-        for i in range(width-kernel_size+1):
-            for j in range(height-kernel_size+1):
-                current_block = padded_2d_image[i:i+kernel_size, j:j+kernel_size]
-                convoluted_value = np.sum(current_block * kernel)
-                filtered_2d_image[i][j] = convoluted_value
-        filtered_image[:,:,each_channel] = filtered_2d_image
 
+def _apply_kernel_separable(image, column, row):
+    # one pass along the rows and one along the columns, a shifted add per tap
+    padded_image = _pad(image, len(column))
+    height, width = image.shape[:2]
+    rows_filtered = np.zeros((padded_image.shape[0], width, image.shape[2]))
+    for j, weight in enumerate(row):
+        rows_filtered += weight * padded_image[:, j:j+width]
+    filtered_image = np.zeros(image.shape)
+    for i, weight in enumerate(column):
+        filtered_image += weight * rows_filtered[i:i+height]
     return filtered_image
 
-def get_gaussian_filter(kernel_size, sigma):
-    kernel = np.zeros((kernel_size, kernel_size))
-    denom = 2 * np.pi * sigma * sigma
+
+def _apply_kernel_fft(image, kernel):
+    # correlation is convolution with the flipped kernel
+    from scipy.signal import fftconvolve
+    padded_image = _pad(image, kernel.shape[0])
+    return fftconvolve(padded_image, kernel[::-1, ::-1, np.newaxis], mode='valid', axes=(0, 1))
+
+
+def apply_kernel(image, kernel, backend='auto'):
+    """ Correlate an image with a square kernel, zero padding the borders
+    Args:
+        image (np.ndarray): HxW or HxWxC image, all channels are filtered together
+        kernel (np.ndarray or tuple): Square kernel, or its (column, row) 1-D
+            factors such as from get_gaussian_factors. Even sizes are anchored
+            like the original loop, which left the last row and column zero
+        backend (str): 'separable' for rank-1 kernels, 'fft', 'strided' or
+            'loop'. 'auto' uses 'fft' for kernels at least FFT_MIN_KERNEL_SIZE
+            wide (FFT_MIN_SEPARABLE_SIZE if rank 1), otherwise 'separable'
+            for rank-1 kernels and 'strided' for the rest.
+    Returns:
+        filtered_image (np.ndarray): float64 image with the shape of image
+    """
+    gray = image.ndim == 2
+    if gray:
+        image = image[:, :, np.newaxis]
+
+    if isinstance(kernel, tuple):
+        # factors given, no need to decompose the kernel
+        factors = kernel
+        kernel = np.outer(*factors)
+    else:
+        kernel = np.asarray(kernel, dtype=np.float64)
+        factors = separable_factors(kernel) if backend in ('auto', 'separable') else None
+    if backend == 'separable' and factors is None:
+        raise ValueError("Kernel is not separable")
+    if backend == 'auto':
+        fft_size = FFT_MIN_KERNEL_SIZE if factors is None else FFT_MIN_SEPARABLE_SIZE
+        if kernel.shape[0] >= fft_size:
+            backend = 'fft'
+        elif factors is not None:
+            backend = 'separable'
+        else:
+            backend = 'strided'
+
+    if backend == 'separable':
+        filtered_image = _apply_kernel_separable(image, *factors)
+    elif backend == 'fft':
+        filtered_image = _apply_kernel_fft(image, kernel)
+    elif backend == 'strided':
+        filtered_image = _apply_kernel_strided(image, kernel)
+    elif backend == 'loop':
+        filtered_image = _apply_kernel_loop(image, kernel)
+    else:
+        raise ValueError(f"Unknown backend {backend!r}")
+
+    if kernel.shape[0] % 2 == 0:
+        # the original loop had one window fewer than pixels per axis here
+        filtered_image[-1] = 0
+        filtered_image[:, -1] = 0
+    return filtered_image[:, :, 0] if gray else filtered_image
+
+# number of (kernel_size, sigma) Gaussian kernels kept by get_gaussian_filter
+GAUSSIAN_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=GAUSSIAN_CACHE_SIZE)
+def get_gaussian_factors(kernel_size, sigma):
+    """ 1-D factors of the normalised Gaussian kernel
+    Args:
+        kernel_size (int): Odd kernel width
+        sigma (float): Standard deviation in pixels
+    Returns:
+        factors (tuple): (column, row) read-only 1-D kernels whose outer
+            product is get_gaussian_filter(kernel_size, sigma)
+    """
     samples = np.arange(-int(kernel_size/2), int(kernel_size/2) + 1)
+    factor = np.exp(-samples * samples / (2 * sigma * sigma))
+    factor /= factor.sum()
+    factor.flags.writeable = False
+    return factor, factor
 
-    for i in range(len(samples)):
-        for j in range(len(samples)):
-            x = samples[i]
-            y = samples[j]
-            num = np.exp(-1*(((x*x) + (y*y)) / (2*sigma*sigma)))
-            val = num / np.sqrt(denom)
-            kernel[i][kernel_size - j - 1] = val
-    kernel = kernel / kernel.sum()
-    
+
+@functools.lru_cache(maxsize=GAUSSIAN_CACHE_SIZE)
+def get_gaussian_filter(kernel_size, sigma):
+    """ Normalised 2-D Gaussian kernel, built once per (kernel_size, sigma)
+    Args:
+        kernel_size (int): Odd kernel width
+        sigma (float): Standard deviation in pixels
+    Returns:
+        kernel (np.ndarray): Read-only kernel_size x kernel_size kernel, copy it
+            before modifying
+    """
+    kernel = np.outer(*get_gaussian_factors(kernel_size, sigma))
+    kernel.flags.writeable = False
     return kernel
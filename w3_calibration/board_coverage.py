@@ -0,0 +1,96 @@
+"""
+Coverage of board positions, scales and tilts for selecting calibration frames.
+"""
+import cv2
+import numpy as np
+
+from w3_calibration import board_points
+
+
+def board_pose(corners, chessboard_size, image_size):
+    """Rough board pose from its detected corners.
+
+    The pose is solved with a nominal pinhole camera (focal length equal to
+    the image width, principal point at the centre), which is accurate enough
+    to tell tilts apart before the camera is calibrated.
+
+    Returns (centre, scale, tilt): the board centre as a fraction of the
+    image size, the square root of the fraction of the image the board
+    covers, and its (x, y) tilt towards the camera in degrees.
+    """
+    width, height = image_size
+    points = corners.reshape(-1, 2)
+    centre = points.mean(axis=0) / (width, height)
+    outline = points[[0, chessboard_size[0] - 1, -1, -chessboard_size[0]]].astype(np.float32)
+    scale = np.sqrt(cv2.contourArea(outline) / (width * height))
+
+    camera_matrix = np.array([[width, 0, width / 2], [0, width, height / 2], [0, 0, 1]], dtype=np.float64)
+    # the square size only scales the translation, the rotation is the same
+    _, rvec, _ = cv2.solvePnP(board_points(chessboard_size), points.astype(np.float32), camera_matrix, None)
+    normal = cv2.Rodrigues(rvec)[0][:, 2]
+    normal *= np.sign(normal[2]) or 1.0
+    tilt = np.degrees(np.arctan2(normal[:2], normal[2]))
+    return centre, scale, tilt
+
+
+class CoverageGrid:
+    def __init__(self, image_size, chessboard_size=(4, 7), position_bins=(3, 3),
+                 scale_edges=(0.3, 0.5), tilt_edges=(-30.0, -10.0, 10.0, 30.0)):
+        """Track which board positions, scales and tilts have been captured.
+
+        Two grids are kept: image position (position_bins columns and rows)
+        by scale, and x tilt by y tilt. A frame adds coverage when its board
+        falls in a cell of either grid that no earlier frame filled, so at
+        most one frame per cell is kept.
+
+        Args:
+            image_size: (width, height) of the frames.
+            chessboard_size: Number of internal corners per row and column.
+            position_bins: Number of (horizontal, vertical) position cells.
+            scale_edges: Bin edges of the board scale returned by board_pose.
+            tilt_edges: Bin edges of the board tilts in degrees.
+        """
+        self.image_size = tuple(image_size)
+        self.chessboard_size = chessboard_size
+        self.position_bins = position_bins
+        self.scale_edges = scale_edges
+        self.tilt_edges = tilt_edges
+        self.covered = set()
+
+    @property
+    def size(self):
+        """Total number of cells of both grids."""
+        scales = len(self.scale_edges) + 1
+        tilts = len(self.tilt_edges) + 1
+        return self.position_bins[0] * self.position_bins[1] * scales + tilts * tilts
+
+    @property
+    def coverage(self):
+        """Fraction of the cells filled so far."""
+        return len(self.covered) / self.size
+
+    def cells(self, corners):
+        """The position/scale and tilt cells of a detected board."""
+        centre, scale, tilt = board_pose(corners, self.chessboard_size, self.image_size)
+        column, row = np.minimum((centre * self.position_bins).astype(int), np.subtract(self.position_bins, 1))
+        column, row = max(int(column), 0), max(int(row), 0)
+        tilt_x, tilt_y = np.digitize(tilt, self.tilt_edges)
+        return {('position', column, row, int(np.digitize(scale, self.scale_edges))),
+                ('tilt', int(tilt_x), int(tilt_y))}
+
+    def is_new(self, corners):
+        """Whether a board falls in any cell not covered yet."""
+        return not self.cells(corners) <= self.covered
+
+    def add(self, corners):
+        """Mark the cells of a board as covered, True if any of them was new."""
+        new = self.cells(corners) - self.covered
+        self.covered |= new
+        return bool(new)
+
+
+def is_steady(previous, corners, tolerance=2.0):
+    """Whether the board moved less than tolerance pixels between two detections."""
+    if previous is None or corners is None or previous.shape != corners.shape:
+        return False
+    return np.abs(previous - corners).max() < tolerance
@@ -0,0 +1,128 @@
+"""
+Batched reprojection errors and outlier-view rejection for camera calibration.
+"""
+import time
+
+import cv2
+import numpy as np
+
+
+def rodrigues(rvecs):
+    """Rotation matrices of shape (V, 3, 3) from (V, 3) axis-angle vectors."""
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)[:, np.newaxis, np.newaxis]
+    safe_theta = np.where(theta > 1e-12, theta, 1.0)
+    k = rvecs[:, :, np.newaxis] / safe_theta
+    kx = np.zeros((len(rvecs), 3, 3))
+    kx[:, 0, 1], kx[:, 0, 2] = -k[:, 2, 0], k[:, 1, 0]
+    kx[:, 1, 0], kx[:, 1, 2] = k[:, 2, 0], -k[:, 0, 0]
+    kx[:, 2, 0], kx[:, 2, 1] = -k[:, 1, 0], k[:, 0, 0]
+    return (np.cos(theta) * np.eye(3) + (1 - np.cos(theta)) * (k @ k.transpose(0, 2, 1))
+            + np.sin(theta) * kx)
+
+
+def project_points(objpoints, rvecs, tvecs, camera_matrix, dist_coeffs):
+    """Project the points of every view in one batch, like cv2.projectPoints.
+
+    As in OpenCV, the skew entry of camera_matrix is ignored.
+
+    Args:
+        objpoints: (V, N, 3) board points of each view.
+        rvecs, tvecs: Per-view poses as returned by cv2.calibrateCamera.
+        camera_matrix: 3x3 intrinsics.
+        dist_coeffs: Up to 8 coefficients (k1, k2, p1, p2[, k3[, k4, k5, k6]]);
+            longer models fall back to cv2.projectPoints per view.
+    Returns:
+        points (np.ndarray): (V, N, 2) projected image points.
+    """
+    objpoints = np.asarray(objpoints, dtype=np.float64).reshape(len(rvecs), -1, 3)
+    dist = np.ravel(dist_coeffs).astype(np.float64)
+    if len(dist) > 8:
+        return np.stack([cv2.projectPoints(obj, r, t, camera_matrix, dist_coeffs)[0].reshape(-1, 2)
+                         for obj, r, t in zip(objpoints, rvecs, tvecs)])
+    k1, k2, p1, p2, k3, k4, k5, k6 = np.pad(dist, (0, 8 - len(dist)))
+
+    rotations = rodrigues(rvecs)
+    translations = np.asarray(tvecs, dtype=np.float64).reshape(-1, 1, 3)
+    cam = objpoints @ rotations.transpose(0, 2, 1) + translations
+    x = cam[..., 0] / cam[..., 2]
+    y = cam[..., 1] / cam[..., 2]
+
+    r2 = x * x + y * y
+    radial = (1 + r2 * (k1 + r2 * (k2 + r2 * k3))) / (1 + r2 * (k4 + r2 * (k5 + r2 * k6)))
+    xd = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+    yd = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+
+    K = np.asarray(camera_matrix, dtype=np.float64)
+    return np.stack([K[0, 0] * xd + K[0, 2], K[1, 1] * yd + K[1, 2]], axis=-1)
+
+
+def reprojection_report(objpoints, imgpoints, rvecs, tvecs, camera_matrix, dist_coeffs):
+    """Reprojection errors of every corner and view from one batched projection.
+
+    Returns a dict with
+        corner_errors: (V, N) pixel distance of every corner,
+        view_rms: (V,) RMS error of each view,
+        rms: overall RMS error, as reported by cv2.calibrateCamera,
+        mean_error: mean over views of L2 norm / N, the "total error" printed
+            by w3_calibration.py.
+    """
+    imgpoints = np.asarray(imgpoints, dtype=np.float64).reshape(len(rvecs), -1, 2)
+    projected = project_points(objpoints, rvecs, tvecs, camera_matrix, dist_coeffs)
+    corner_errors = np.linalg.norm(projected - imgpoints, axis=2)
+    n_corners = corner_errors.shape[1]
+    return dict(corner_errors=corner_errors,
+                view_rms=np.sqrt(np.mean(corner_errors ** 2, axis=1)),
+                rms=np.sqrt(np.mean(corner_errors ** 2)),
+                mean_error=np.mean(np.linalg.norm(corner_errors, axis=1) / n_corners))
+
+
+def calibrate_rejecting_outliers(objpoints, imgpoints, image_size, outlier_factor=2.0, min_views=8,
+                                 tol=1e-3, max_iterations=20, flags=0):
+    """Calibrate, then repeatedly drop the worst views and recalibrate.
+
+    Each round the views whose RMS error exceeds outlier_factor times the
+    median view RMS are dropped, at most a quarter of the remaining views at
+    a time and never going below min_views.  The loop stops when no view is
+    an outlier or the overall RMS improves by less than a relative tol.
+
+    Returns (calibration, keep, history): calibration is the
+    (rms, camera_matrix, dist_coeffs, rvecs, tvecs) of cv2.calibrateCamera
+    for the kept views, keep the indices of those views and history one dict
+    per round with the number of views, RMS and timings in seconds.
+    """
+    keep = previous_keep = np.arange(len(objpoints))
+    history = []
+    calibration = None
+    for _ in range(max_iterations):
+        start = time.perf_counter()
+        candidate = cv2.calibrateCamera([objpoints[i] for i in keep], [imgpoints[i] for i in keep],
+                                        image_size, None, None, flags=flags)
+        calibrate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        report = reprojection_report([objpoints[i] for i in keep], [imgpoints[i] for i in keep],
+                                     *candidate[3:], candidate[1], candidate[2])
+        history.append(dict(views=len(keep), rms=candidate[0], calibrate_time=calibrate_time,
+                            report_time=time.perf_counter() - start))
+
+        if calibration is not None and calibration[0] - candidate[0] < tol * calibration[0]:
+            # no longer worth dropping views, undo the last round
+            keep = previous_keep
+            history[-1]['accepted'] = False
+            break
+        calibration = candidate
+
+        view_rms = report['view_rms']
+        outliers = np.flatnonzero(view_rms > outlier_factor * np.median(view_rms))
+        budget = min(len(keep) // 4, len(keep) - min_views)
+        if len(outliers) == 0 or budget <= 0:
+            break
+        worst = outliers[np.argsort(view_rms[outliers])[::-1][:budget]]
+        previous_keep = keep
+        keep = np.delete(keep, worst)
+    else:
+        # out of iterations, the views of the last removal were never calibrated
+        keep = previous_keep
+
+    return calibration, keep, history
@@ -0,0 +1,87 @@
+"""
+Fast lens undistortion for streams of frames using precomputed remap tables.
+"""
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class Undistorter:
+    def __init__(self, camera_matrix, dist_coeffs, alpha=1.0, calibration_size=None, max_maps=4):
+        """Undistort frames with remap tables built once per resolution and alpha.
+
+        Args:
+            camera_matrix: 3x3 intrinsics from the calibration.
+            dist_coeffs: Distortion coefficients from the calibration.
+            alpha: Default free scaling of getOptimalNewCameraMatrix, 0 keeps
+                only valid pixels and 1 keeps every source pixel.
+            calibration_size: (width, height) the camera was calibrated at.
+                Frames of another size get proportionally scaled intrinsics;
+                if None, frames are assumed to match the calibration.
+            max_maps: Number of (size, alpha) remap tables kept.
+        """
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+        self.alpha = alpha
+        self.calibration_size = calibration_size
+        self.max_maps = max_maps
+        self._maps = OrderedDict()
+        self._buffers = {}
+
+    @classmethod
+    def from_file(cls, path='calibration_data.npz', **kwargs):
+        """Create an Undistorter from the .npz saved by w3_calibration.py."""
+        with np.load(path) as data:
+            return cls(data['camera_matrix'], data['dist_coeffs'], **kwargs)
+
+    def maps(self, size, alpha=None):
+        """Remap tables for frames of the given (width, height).
+
+        Returns (map1, map2, new_camera_matrix, roi); the fixed-point CV_16SC2
+        tables are built on first use and cached for later frames.
+        """
+        alpha = self.alpha if alpha is None else alpha
+        key = (tuple(size), alpha)
+        if key in self._maps:
+            self._maps.move_to_end(key)
+            return self._maps[key]
+
+        camera_matrix = self.camera_matrix
+        if self.calibration_size is not None and tuple(size) != tuple(self.calibration_size):
+            scale = np.array([[size[0] / self.calibration_size[0]], [size[1] / self.calibration_size[1]], [1.0]])
+            camera_matrix = camera_matrix * scale
+        new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(camera_matrix, self.dist_coeffs, size, alpha, size)
+        map1, map2 = cv2.initUndistortRectifyMap(camera_matrix, self.dist_coeffs, None, new_camera_matrix,
+                                                 size, cv2.CV_16SC2)
+
+        self._maps[key] = (map1, map2, new_camera_matrix, roi)
+        if len(self._maps) > self.max_maps:
+            self._maps.popitem(last=False)
+        return self._maps[key]
+
+    def __call__(self, frame, out=None, alpha=None, crop=False):
+        """Undistort one frame.
+
+        Args:
+            frame: Image to undistort.
+            out: Array to write into. By default a buffer owned by the
+                Undistorter is reused, so the result is overwritten by the
+                next frame of the same shape; copy it to keep it.
+            alpha: Free scaling for this frame, the default alpha if None.
+            crop: Return only the valid region of interest (a view of out).
+        Returns:
+            undistorted (np.ndarray): The undistorted frame.
+        """
+        height, width = frame.shape[:2]
+        map1, map2, _, roi = self.maps((width, height), alpha)
+        if out is None:
+            key = (frame.shape, frame.dtype)
+            if key not in self._buffers:
+                self._buffers[key] = np.empty_like(frame)
+            out = self._buffers[key]
+        cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=out)
+        if crop:
+            x, y, w, h = roi
+            return out[y:y+h, x:x+w]
+        return out
@@ -1,78 +1,246 @@
+import argparse
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import cv2
 import numpy as np
-import glob
+
+from reprojection import calibrate_rejecting_outliers, reprojection_report
+from undistort import Undistorter
 
 # Step 1: Prepare object points
 # Define the chessboard size (number of internal corners)
 chessboard_size = (4, 7)  # Adjust based on your calibration board
 square_size = 34.0  # Size of a square in your defined unit (e.g., 1.0 for meters or mm)
 
-# Prepare the object points for a standard chessboard
-objp = np.zeros((chessboard_size[0] * chessboard_size[1], 3), np.float32)
-objp[:, :2] = np.mgrid[0:chessboard_size[0], 0:chessboard_size[1]].T.reshape(-1, 2)
-objp *= square_size
+# Termination criteria of the sub-pixel corner refinement
+subpix_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
-# Arrays to store object points and image points from all the images
-objpoints = []  # 3D points in the real world
-imgpoints = []  # 2D points in the image plane
+# Suffix of the annotated images written next to the calibration images
+derived_suffix = '_corners_detected.jpg'
 
-# Step 2: Load calibration images
-images = glob.glob('./calibration_images/*.jpg')  # Adjust the path as needed
-
-for fname in images:
-    img = cv2.imread(fname)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-    # Step 3: Find the chessboard corners
-    ret, corners = cv2.findChessboardCorners(gray, chessboard_size, None)
 
-    if ret:
-        objpoints.append(objp)  # Add object points
-        imgpoints.append(corners)  # Add image points
+def board_points(chessboard_size=chessboard_size, square_size=square_size):
+    """Object points of the chessboard corners in the board frame (z = 0)."""
+    objp = np.zeros((chessboard_size[0] * chessboard_size[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:chessboard_size[0], 0:chessboard_size[1]].T.reshape(-1, 2)
+    return objp * square_size
 
-        # Optional: Draw and display the corners for visualization
-        cv2.drawChessboardCorners(img, chessboard_size, corners, ret)
-        cv2.imshow('Chessboard', img)
-        cv2.waitKey(500)
-        output_fname = fname.replace('.jpg', '_corners_detected.jpg')  # Adjust extension if necessary
-        cv2.imwrite(output_fname, img)
 
-cv2.destroyAllWindows()
+def find_corners(fname, chessboard_size=chessboard_size, annotate=False):
+    """Detect and refine the chessboard corners of one image.
 
-# Step 4: Perform camera calibration
-ret, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, gray.shape[::-1], None, None)
+    Args:
+        fname: Path of the image.
+        chessboard_size: Number of internal corners per row and column.
+        annotate: Also write the detected corners to <fname>_corners_detected.jpg.
+    Returns:
+        (corners, image_size): Sub-pixel corners, or None if the board was not
+        found, and the (width, height) of the image.
+    """
+    gray = cv2.imread(fname, cv2.IMREAD_GRAYSCALE)
+    image_size = gray.shape[::-1]
 
-# Step 5: Display results
-print("Camera Matrix:\n", camera_matrix)
-print("\nDistortion Coefficients:\n", dist_coeffs)
-
-# Step 6: Save the calibration results
-np.savez('calibration_data.npz', camera_matrix=camera_matrix, dist_coeffs=dist_coeffs, rvecs=rvecs, tvecs=tvecs)
-
-# Step 7: Use the calibration results to undistort an image
-img = cv2.imread('./calibration_images/calibration_image_02.jpg')  # Replace with an image to undistort
-# img = cv2.cvtColor()
-h, w = img.shape[:2]
-new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(camera_matrix, dist_coeffs, (w, h), 1, (w, h))
-
-# Undistort the image
-undistorted_img = cv2.undistort(img, camera_matrix, dist_coeffs, None, new_camera_matrix)
-
-
-# Crop the image (optional, based on ROI)
-x, y, w, h = roi
-undistorted_img = undistorted_img[y:y+h, x:x+w]
+    ret, corners = cv2.findChessboardCorners(gray, chessboard_size, None)
+    if not ret:
+        return None, image_size
+    corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), subpix_criteria)
 
-mean_error = 0
-for i in range(len(objpoints)):
-    imgpoints2, _ = cv2.projectPoints(objpoints[i], rvecs[i], tvecs[i], camera_matrix, dist_coeffs)
-    error = cv2.norm(imgpoints[i], imgpoints2, cv2.NORM_L2) / len(imgpoints2)
-    mean_error += error
+    if annotate:
+        annotate_corners(fname, corners, chessboard_size)
+    return corners, image_size
 
-print("total error: {}".format(mean_error / len(objpoints)))
 
-# Display the original and undistorted images
-cv2.imshow('Original Image', img)
-cv2.imshow('Undistorted Image', undistorted_img)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+def annotate_corners(fname, corners, chessboard_size=chessboard_size):
+    """Write the image with its detected corners drawn to <fname>_corners_detected.jpg."""
+    img = cv2.imread(fname)
+    cv2.drawChessboardCorners(img, chessboard_size, corners, True)
+    output_fname = fname.replace('.jpg', derived_suffix)  # Adjust extension if necessary
+    cv2.imwrite(output_fname, img)
+
+
+def cache_key(fname, chessboard_size=chessboard_size, square_size=square_size):
+    """Corner cache key from the image content and the board parameters."""
+    digest = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        digest.update(f.read())
+    digest.update(repr((tuple(chessboard_size), float(square_size))).encode())
+    return digest.hexdigest()
+
+
+def _load_cached(path):
+    with np.load(path) as entry:
+        corners = entry['corners'] if entry['found'] else None
+        return corners, tuple(int(v) for v in entry['image_size'])
+
+
+def _save_cached(path, corners, image_size):
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, found=corners is not None, image_size=image_size,
+             corners=corners if corners is not None else np.zeros((0, 1, 2), np.float32))
+    os.replace(tmp_path, path)
+
+
+def detect_corners(images, chessboard_size=chessboard_size, workers=None, annotate=False,
+                   cache_dir=None, square_size=square_size):
+    """Run find_corners over images on a pool of worker processes.
+
+    With a cache_dir, results are stored there keyed by cache_key, so images
+    whose content and board parameters were seen before are not processed
+    again, whether or not a board was found in them.  With annotate, cached
+    detections are drawn from the stored corners.
+
+    Returns a list of (fname, corners, image_size) in the order of images.
+    """
+    results = {}
+    todo = list(images)
+    paths = {}
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        todo = []
+        for fname in images:
+            paths[fname] = os.path.join(cache_dir, cache_key(fname, chessboard_size, square_size) + '.npz')
+            if os.path.exists(paths[fname]):
+                results[fname] = _load_cached(paths[fname])
+                if annotate and results[fname][0] is not None:
+                    annotate_corners(fname, results[fname][0], chessboard_size)
+            else:
+                todo.append(fname)
+
+    detect = partial(find_corners, chessboard_size=chessboard_size, annotate=annotate)
+    if workers == 1 or len(todo) < 2:
+        detected = map(detect, todo)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            detected = list(pool.map(detect, todo))
+    for fname, (corners, size) in zip(todo, detected):
+        results[fname] = (corners, size)
+        if cache_dir is not None:
+            _save_cached(paths[fname], corners, size)
+
+    return [(fname,) + results[fname] for fname in images]
+
+
+def calibrate(images, chessboard_size=chessboard_size, square_size=square_size, workers=None,
+              annotate=False, show=False, output='calibration_data.npz', cache_dir=None,
+              reject_outliers=False):
+    """Calibrate the camera from chessboard images without any user interaction.
+
+    Args:
+        images: Paths of the calibration images.
+        chessboard_size: Number of internal corners per row and column.
+        square_size: Size of a chessboard square.
+        workers: Number of detection processes, all cores by default.
+        annotate: Write a _corners_detected.jpg copy of every detection.
+        show: Display every detection for 500ms.
+        output: Where to save the .npz results, None to skip saving.
+        cache_dir: Directory of the corner cache, None to always detect.
+            Annotated images written by earlier runs are always skipped.
+        reject_outliers: Iteratively drop views with large reprojection
+            errors and recalibrate, see calibrate_rejecting_outliers.
+    Returns:
+        dict with the saved camera_matrix, dist_coeffs, rvecs and tvecs, plus
+        the RMS reprojection error (rms), image_size, the object and image
+        points used (objpoints, imgpoints), the matching image paths (used),
+        the reprojection_report of the final calibration (report) and the
+        rejection rounds (history, empty without reject_outliers).
+    """
+    images = [fname for fname in images if not fname.endswith(derived_suffix)]
+    detections = detect_corners(images, chessboard_size, workers, annotate, cache_dir, square_size)
+    detections = [d for d in detections if d[1] is not None]
+    if not detections:
+        raise RuntimeError("No chessboard detected in any calibration image")
+
+    if show:
+        for fname, corners, _ in detections:
+            img = cv2.imread(fname)
+            cv2.drawChessboardCorners(img, chessboard_size, corners, True)
+            cv2.imshow('Chessboard', img)
+            cv2.waitKey(500)
+        cv2.destroyAllWindows()
+
+    # Arrays to store object points and image points from all the images
+    objp = board_points(chessboard_size, square_size)
+    objpoints = [objp] * len(detections)  # 3D points in the real world
+    imgpoints = [corners for _, corners, _ in detections]  # 2D points in the image plane
+    image_size = detections[-1][2]
+
+    # Perform camera calibration
+    history = []
+    if reject_outliers:
+        calibration, keep, history = calibrate_rejecting_outliers(objpoints, imgpoints, image_size)
+        detections = [detections[i] for i in keep]
+        objpoints = [objpoints[i] for i in keep]
+        imgpoints = [imgpoints[i] for i in keep]
+    else:
+        calibration = cv2.calibrateCamera(objpoints, imgpoints, image_size, None, None)
+    rms, camera_matrix, dist_coeffs, rvecs, tvecs = calibration
+    report = reprojection_report(objpoints, imgpoints, rvecs, tvecs, camera_matrix, dist_coeffs)
+
+    # Save the calibration results
+    if output is not None:
+        np.savez(output, camera_matrix=camera_matrix, dist_coeffs=dist_coeffs, rvecs=rvecs, tvecs=tvecs)
+
+    return dict(camera_matrix=camera_matrix, dist_coeffs=dist_coeffs, rvecs=rvecs, tvecs=tvecs,
+                rms=rms, image_size=image_size, objpoints=objpoints, imgpoints=imgpoints,
+                used=[fname for fname, _, _ in detections], report=report, history=history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate a camera from chessboard images.")
+    parser.add_argument('--images', default='./calibration_images/*.jpg', help="Glob of calibration images")
+    parser.add_argument('--output', default='calibration_data.npz')
+    parser.add_argument('--workers', type=int, default=None, help="Detection processes, all cores by default")
+    parser.add_argument('--annotate', action='store_true', help="Save _corners_detected.jpg images")
+    parser.add_argument('--show', action='store_true', help="Display detections and the undistorted image")
+    parser.add_argument('--cache-dir', default='./calibration_images/.corner_cache',
+                        help="Corner cache directory, pass an empty string to disable")
+    parser.add_argument('--reject-outliers', action='store_true',
+                        help="Drop views with large reprojection errors and recalibrate")
+    parser.add_argument('--undistort', default='./calibration_images/calibration_image_02.jpg',
+                        help="Image to undistort with the --show preview")
+    args = parser.parse_args()
+
+    # Load calibration images
+    images = [fname for fname in sorted(glob.glob(args.images)) if not fname.endswith(derived_suffix)]
+    results = calibrate(images, workers=args.workers, annotate=args.annotate, show=args.show,
+                        output=args.output, cache_dir=args.cache_dir or None,
+                        reject_outliers=args.reject_outliers)
+    camera_matrix, dist_coeffs = results['camera_matrix'], results['dist_coeffs']
+    report = results['report']
+
+    # Display results
+    print(f"Used {len(results['used'])} of {len(images)} images matching {args.images}")
+    print("Camera Matrix:\n", camera_matrix)
+    print("\nDistortion Coefficients:\n", dist_coeffs)
+
+    for round_, step in enumerate(results['history']):
+        print(f"round {round_}: {step['views']} views, RMS {step['rms']:.4f}, "
+              f"calibration {step['calibrate_time']:.3f}s, report {step['report_time'] * 1e3:.2f}ms"
+              + ("" if step.get('accepted', True) else " (not accepted)"))
+
+    print("\nReprojection RMS per view:")
+    for fname, view_rms, worst in zip(results['used'], report['view_rms'], report['corner_errors'].max(axis=1)):
+        print(f"  {os.path.basename(fname)}: {view_rms:.4f} px (worst corner {worst:.4f} px)")
+    print("RMS error: {}".format(report['rms']))
+    print("total error: {}".format(report['mean_error']))
+
+    if not args.show or not os.path.exists(args.undistort):
+        return
+
+    # Use the calibration results to undistort an image, cropped to the ROI
+    img = cv2.imread(args.undistort)
+    undistorted_img = Undistorter(camera_matrix, dist_coeffs, alpha=1)(img, crop=True)
+
+    # Display the original and undistorted images
+    cv2.imshow('Original Image', img)
+    cv2.imshow('Undistorted Image', undistorted_img)
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,14 @@
-import cv2
+import argparse
 import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from board_coverage import CoverageGrid, is_steady
+from w3_calibration import subpix_criteria
 
 # Parameters
 output_folder = "./calibration_images"  # Folder to save the images
@@ -7,54 +16,260 @@ chessboard_size = (4, 7)  # Inner corners in the chessboard
 capture_key = 'c'  # Key to capture the image
 exit_key = 'q'  # Key to exit the program
 
+# Width of the downscaled frame the chessboard is searched in
+detect_width = 640
+
+# Flags of the live chessboard search, FAST_CHECK quickly rejects frames without a board
+detect_flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
 
-# Create the output folder if it doesn't exist
-os.makedirs(output_folder, exist_ok=True)
 
-# Open the webcam (use the appropriate index if multiple cameras are connected)
-cap = cv2.VideoCapture(0)  # Change the index to 1, 2, etc., if needed
+class FrameGrabber(threading.Thread):
+    def __init__(self, cap, buffer_size=4):
+        """Read frames from the camera on a thread into a bounded ring buffer.
 
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 800)
+        Args:
+            cap: Opened cv2.VideoCapture.
+            buffer_size: Number of most recent frames kept, older frames are
+                dropped so slow consumers never stall the camera.
+        """
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.frames = deque(maxlen=buffer_size)
+        self.frame_count = 0
+        self.failed = False
+        self.fps = 0.0
+        self._stop_event = threading.Event()
+        self._condition = threading.Condition()
 
-if not cap.isOpened():
-    print("Error: Unable to access the camera.")
-    exit()
+    def run(self):
+        last = time.perf_counter()
+        while not self._stop_event.is_set():
+            ret, frame = self.cap.read()
+            now = time.perf_counter()
+            with self._condition:
+                if not ret:
+                    self.failed = True
+                    self._condition.notify_all()
+                    return
+                self.frames.append((self.frame_count, frame))
+                self.frame_count += 1
+                self.fps = 0.9 * self.fps + 0.1 / max(now - last, 1e-6)
+                self._condition.notify_all()
+            last = now
 
-print(f"Press '{capture_key}' to capture an image and save it.")
-print(f"Press '{exit_key}' to quit.")
+    def latest(self, after=-1, timeout=None):
+        """Newest (index, frame) with an index greater than after.
 
-image_count = 0  # Counter for saved images
+        Waits up to timeout seconds for such a frame and returns None if none
+        arrived or the camera stopped delivering frames.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.frame_count - 1 > after or self.failed
+                                     or self._stop_event.is_set(), timeout)
+            if self.frame_count - 1 > after:
+                return self.frames[-1]
+            return None
 
-while True:
-    # Read a frame from the camera
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Unable to read from the camera.")
-        break
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
 
-    # Convert the frame to grayscale for chessboard detection
+
+def detect_board(frame, chessboard_size=chessboard_size, detect_width=detect_width):
+    """Find the chessboard in a downscaled copy of frame.
+
+    The corners found at low resolution are scaled back and refined on the
+    full-resolution grey image, so they can be drawn on or saved with frame.
+    Returns the (N, 1, 2) corners, or None if no board was found.
+    """
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    scale = min(1.0, detect_width / gray.shape[1])
+    small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    found, corners = cv2.findChessboardCorners(small, chessboard_size, flags=detect_flags)
+    if not found:
+        return None
+    corners /= scale
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), subpix_criteria)
+
+
+class BoardDetector(threading.Thread):
+    def __init__(self, grabber, chessboard_size=chessboard_size, detect_width=detect_width):
+        """Run detect_board on the newest grabbed frame, skipping frames it cannot keep up with.
+
+        The last result is available as detection, a tuple of
+        (frame index, frame, corners or None).
+        """
+        super().__init__(daemon=True)
+        self.grabber = grabber
+        self.chessboard_size = chessboard_size
+        self.detect_width = detect_width
+        self.detection = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        index = -1
+        while not self._stop_event.is_set():
+            latest = self.grabber.latest(after=index, timeout=0.1)
+            if latest is None:
+                if self.grabber.failed:
+                    return
+                continue
+            index, frame = latest
+            self.detection = (index, frame, detect_board(frame, self.chessboard_size, self.detect_width))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class ImageWriter(threading.Thread):
+    def __init__(self, queue_size=16):
+        """Encode and write images on a background thread.
+
+        Args:
+            queue_size: Number of images waiting to be written before save
+                starts refusing new ones.
+        """
+        super().__init__(daemon=True)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+
+    def save(self, path, image):
+        """Queue image to be written to path, False if the queue is full."""
+        try:
+            self.queue.put_nowait((path, image))
+        except queue.Full:
+            return False
+        return True
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, image = item
+            if cv2.imwrite(path, image):
+                self.written += 1
+            else:
+                print(f"Error: Unable to write {path}")
+
+    def close(self):
+        """Write the queued images and stop the thread."""
+        self.queue.put(None)
+        self.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture chessboard images for camera calibration.")
+    parser.add_argument('--camera', default='0', help="Camera index or video file")
+    parser.add_argument('--output', default=output_folder, help="Folder to save the images")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=800)
+    parser.add_argument('--detect-width', type=int, default=detect_width,
+                        help="Width of the downscaled frame used for the live detection")
+    parser.add_argument('--buffer', type=int, default=4, help="Frames kept in the capture ring buffer")
+    parser.add_argument('--auto', action='store_true',
+                        help="Save steady frames automatically whenever they add board coverage")
+    parser.add_argument('--max-images', type=int, default=None, help="Stop after saving this many images")
+    args = parser.parse_args()
+
+    # Create the output folder if it doesn't exist
+    os.makedirs(args.output, exist_ok=True)
+
+    # Open the webcam (use the appropriate index if multiple cameras are connected)
+    cap = cv2.VideoCapture(int(args.camera) if args.camera.isdigit() else args.camera)
+
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+
+    if not cap.isOpened():
+        print("Error: Unable to access the camera.")
+        return
+
+    print(f"Press '{capture_key}' to capture an image and save it.")
+    print(f"Press '{exit_key}' to quit.")
+    if args.auto:
+        print("Auto-capture: hold the board still in new positions, distances and tilts.")
+
+    # Grab, detect and write on their own threads so the display keeps the camera frame rate
+    grabber = FrameGrabber(cap, args.buffer)
+    detector = BoardDetector(grabber, chessboard_size, args.detect_width)
+    writer = ImageWriter()
+    for thread in (grabber, detector, writer):
+        thread.start()
+
+    image_count = 0  # Counter for saved images
+    index = -1
+    coverage = None  # Created from the size of the first frame
+    previous = None  # Last detection, to wait for the board to be held still
+
+    def save(frame):
+        nonlocal image_count
+        image_path = os.path.join(args.output, f"calibration_image_{image_count:02d}.jpg")
+        if not writer.save(image_path, frame):
+            print("Writer busy, image dropped. Please try again.")
+            return False
+        print(f"Image saved: {image_path}")
+        image_count += 1
+        return True
+
+    while True:
+        latest = grabber.latest(after=index, timeout=1.0)
+        if latest is None:
+            if grabber.failed:
+                print("Error: Unable to read from the camera.")
+                break
+            continue
+        index, frame = latest
+        if coverage is None:
+            coverage = CoverageGrid(frame.shape[1::-1], chessboard_size)
+
+        # Save new detections that add coverage once the board is held still
+        detection = detector.detection
+        if args.auto and detection is not None and detection is not previous:
+            steady = previous is not None and is_steady(previous[2], detection[2])
+            if steady and coverage.is_new(detection[2]) and save(detection[1]):
+                coverage.add(detection[2])
+            previous = detection
+
+        # Show the frame with the corners of the last detection
+        display = frame.copy()
+        if detection is not None and detection[2] is not None:
+            cv2.drawChessboardCorners(display, chessboard_size, detection[2], True)
+        status = "board" if detection is not None and detection[2] is not None else "no board"
+        cv2.putText(display, f"{grabber.fps:.0f} fps, {status}, {image_count} saved, "
+                             f"{coverage.coverage:.0%} coverage", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        cv2.imshow("Calibration Capture", display)
+
+        # Wait for a key press
+        key = cv2.waitKey(1) & 0xFF
+
+        if key == ord(capture_key):  # Save the last frame the board was detected in
+            if detection is not None and detection[2] is not None:
+                if save(detection[1]):
+                    coverage.add(detection[2])
+            else:
+                print("No chessboard detected. Please adjust the position and try again.")
 
-    # Show the frame
-    cv2.imshow("Calibration Capture", frame)
+        elif key == ord(exit_key):  # Exit the program
+            print("Exiting...")
+            break
 
-    # Wait for a key press
-    key = cv2.waitKey(1) & 0xFF
+        if args.max_images is not None and image_count >= args.max_images:
+            print(f"Saved {image_count} images, exiting...")
+            break
 
-    if key == ord(capture_key):  # Capture and save the image
-        if ret:
-            image_path = os.path.join(output_folder, f"calibration_image_{image_count:02d}.jpg")
-            cv2.imwrite(image_path, frame)
-            print(f"Image saved: {image_path}")
-            image_count += 1
-        else:
-            print("No chessboard detected. Please adjust the position and try again.")
+    # Stop the threads, release the camera and close all windows
+    detector.stop()
+    grabber.stop()
+    detector.join()
+    grabber.join()
+    writer.close()
+    cap.release()
+    cv2.destroyAllWindows()
 
-    elif key == ord(exit_key):  # Exit the program
-        print("Exiting...")
-        break
 
-# Release the camera and close all windows
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()